@@ -0,0 +1,16 @@
+import os
+
+# Кеш ответов API фильмов. Отдельная база Redis, чтобы не пересекаться
+# с ключами async_api
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://{host}:{port}/{db}'.format(
+            host=os.environ.get('REDIS_HOST', '127.0.0.1'),
+            port=os.environ.get('REDIS_PORT', 6379),
+            db=os.environ.get('REDIS_CACHE_DB', 1),
+        ),
+        'KEY_PREFIX': 'admin',
+        'TIMEOUT': int(os.environ.get('MOVIES_API_CACHE_TIMEOUT', 60 * 60)),
+    }
+}
@@ -10,6 +10,7 @@ DEBUG = os.environ.get('DEBUG', False) == 'True'
 
 include(
     'components/database.py',
+    'components/cache.py',
     'components/installed_apps.py',
     'components/middleware.py',
     'components/templates.py',
@@ -1,35 +1,55 @@
+import uuid
+
 from django.contrib import admin
 from .models import Genre, Filmwork, GenreFilmwork, Person, PersonFilmWork
+from .pagination import EstimatedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    # Без фильтров число строк берётся из статистики Postgres,
+    # и второй COUNT(*) по всей таблице при поиске не выполняется
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Genre)
 class GenreAdmin(admin.ModelAdmin):
     list_display = ('name', 'description')
+    search_fields = ('name',)
 
 
 class GenreFilmworkInline(admin.TabularInline):
     model = GenreFilmwork
+    autocomplete_fields = ('genre',)
 
 
 @admin.register(Person)
-class PersonAdmin(admin.ModelAdmin):
+class PersonAdmin(LargeTableAdmin):
     list_display = ('full_name',)
+    # Поиск по full_name использует trigram-индекс (миграция 0003)
+    search_fields = ('full_name',)
 
 
 class PersonFilmWorkInline(admin.TabularInline):
     model = PersonFilmWork
+    # Вместо выпадающего списка всех персон — поиск по мере ввода
+    autocomplete_fields = ('person',)
 
 
 @admin.register(Filmwork)
-class FilmworkAdmin(admin.ModelAdmin):
+class FilmworkAdmin(LargeTableAdmin):
     inlines = (
         GenreFilmworkInline, PersonFilmWorkInline
     )
     list_display = ('title', 'type', 'creation_date', 'rating')
     list_filter = ('type', 'creation_date',)
-    search_fields = ('title', 'description', 'id')
-    list_prefetch_related = ('genres', 'persons')
-
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        return qs.prefetch_related(*self.list_prefetch_related)
+    # Поиск по title использует trigram-индекс (миграция 0003)
+    search_fields = ('title',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # id ищется точным совпадением по первичному ключу
+        try:
+            film_id = uuid.UUID(search_term.strip())
+        except ValueError:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(pk=film_id), False
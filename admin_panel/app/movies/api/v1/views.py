@@ -1,52 +1,183 @@
-from django.contrib.postgres.aggregates import ArrayAgg
-from django.db.models import Q
-from django.http import JsonResponse
+from typing import Iterator
+
+import orjson
+from django.contrib.postgres.fields import ArrayField
+from django.core.exceptions import BadRequest
+from django.db.models import OuterRef, Subquery
+from django.utils.functional import cached_property
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
 from django.views.generic.list import BaseListView
 from django.views.generic.detail import BaseDetailView
 
-from movies.models import Filmwork, PersonFilmWork
+from movies.cache import detail_key, list_key
+from movies.models import Filmwork, GenreFilmwork, PersonFilmWork
+from movies.pagination import EstimatedCountPaginator, KeysetPaginator
+
+
+JSON_CONTENT_TYPE = 'application/json'
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+
+def stream_json(context: dict, chunk_size: int) -> Iterator[bytes]:
+    """
+    Отдаёт context как json по частям: results (queryset) читается
+    серверным курсором по chunk_size строк и не собирается в список.
+    """
+    results = context.pop('results')
+    # {"count":...,"results":[]} без закрывающих "]}"
+    yield orjson.dumps({**context, 'results': []})[:-2]
+    separator = b''
+    for chunk in iterate_chunks(results, chunk_size):
+        yield separator + b','.join(orjson.dumps(row) for row in chunk)
+        separator = b','
+    yield b']}'
+
+
+def stream_ndjson(results, chunk_size: int) -> Iterator[bytes]:
+    for chunk in iterate_chunks(results, chunk_size):
+        yield b''.join(orjson.dumps(row) + b'\n' for row in chunk)
+
+
+def iterate_chunks(results, chunk_size: int) -> Iterator[list]:
+    if hasattr(results, 'iterator'):
+        results = results.iterator(chunk_size=chunk_size)
+    chunk = []
+    for row in results:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ArraySubquery(Subquery):
+    # ARRAY(SELECT ...): коррелированный подзапрос, возвращающий массив
+    # (пустой, если строк нет). В Django 4.0 есть готовый ArraySubquery
+    template = 'ARRAY(%(subquery)s)'
+
+    @cached_property
+    def output_field(self):
+        return ArrayField(self.query.output_field)
 
 
 class MoviesApiMixin:
     model = Filmwork
     http_method_names = ['get']
+    fields = ('id', 'title', 'description', 'creation_date', 'rating', 'type')
+
+    # Жанры и каждая роль считаются отдельным подзапросом по своей таблице
+    # связей. Общий GROUP BY по join жанров и персон строил бы для каждого
+    # фильма декартово произведение жанров на персоны и убирал бы дубли.
+    # DISTINCT ON сохраняет сортировку имён внутри подзапроса
+    def get_genres(self) -> ArraySubquery:
+        return ArraySubquery(
+            GenreFilmwork.objects
+            .filter(film_work=OuterRef('pk'))
+            .values('genre__name')
+            .order_by('genre__name')
+            .distinct('genre__name')
+        )
 
-    def get_array_agg_by_role(self, role: str) -> ArrayAgg:
-        return ArrayAgg(
-            'persons__full_name',
-            filter=Q(personfilmwork__role=role),
-            distinct=True
+    def get_persons_by_role(self, role: str) -> ArraySubquery:
+        return ArraySubquery(
+            PersonFilmWork.objects
+            .filter(film_work=OuterRef('pk'), role=role)
+            .values('person__full_name')
+            .order_by('person__full_name')
+            .distinct('person__full_name')
         )
 
     def get_queryset_annotate(self, queryset):
         return queryset.annotate(
-            genres=ArrayAgg('genres__name', distinct=True),
-            actors=self.get_array_agg_by_role('actor'),
-            directors=self.get_array_agg_by_role('director'),
-            writers=self.get_array_agg_by_role('writer')
+            genres=self.get_genres(),
+            actors=self.get_persons_by_role('actor'),
+            directors=self.get_persons_by_role('director'),
+            writers=self.get_persons_by_role('writer')
         )
 
+    def get_cache_key(self) -> str:
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        # Готовое тело ответа хранится в кеше и сбрасывается сигналами
+        # при изменении фильмов (movies/signals.py)
+        key = self.get_cache_key()
+        content = cache.get(key)
+        if content is not None:
+            return HttpResponse(content, content_type=JSON_CONTENT_TYPE)
+        response = super().get(request, *args, **kwargs)
+        # Потоковые ответы могут быть сколь угодно большими, их не кешируем
+        if not response.streaming:
+            cache.set(key, response.content)
+        return response
+
     def render_to_response(self, context, **response_kwargs):
-        return JsonResponse(context)
+        # orjson сериализует UUID и datetime сам, без медленного
+        # DjangoJSONEncoder.default
+        return HttpResponse(orjson.dumps(context), content_type=JSON_CONTENT_TYPE)
 
 
 class MoviesListApi(MoviesApiMixin, BaseListView):
 
     paginate_by = 50
-
-    def get_queryset(self):
-        qs = self.model.objects.prefetch_related('genres', 'persons')
-        qs = qs.values(
-            'id', 'title', 'description', 'creation_date', 'rating', 'type'
-        )
+    # Общее число фильмов берётся из статистики Postgres, без COUNT(*)
+    paginator_class = EstimatedCountPaginator
+    # Поля, по которым возможен постраничный вывод по курсору (?cursor=)
+    cursor_sort_fields = ('modified', 'title')
+    # ?page_size= не больше этого значения
+    max_page_size = 10000
+    # Сколько строк читать из серверного курсора за раз при ?stream=
+    stream_chunk_size = 500
+
+    def get_cache_key(self) -> str:
+        return list_key(self.request.META.get('QUERY_STRING', ''))
+
+    def get_queryset(self, extra_fields=()):
+        qs = self.model.objects.values(*self.fields, *extra_fields)
         qs = self.get_queryset_annotate(qs)
         return qs
 
+    def get_paginate_by(self, queryset=None) -> int:
+        page_size = self.request.GET.get('page_size')
+        if page_size is None:
+            return self.paginate_by
+        try:
+            page_size = int(page_size)
+        except ValueError:
+            raise BadRequest('invalid page_size')
+        if not 1 <= page_size <= self.max_page_size:
+            raise BadRequest('invalid page_size')
+        return page_size
+
+    def is_streaming(self) -> bool:
+        return 'stream' in self.request.GET
+
+    def get(self, request, *args, **kwargs):
+        if 'export' in request.GET:
+            # Весь каталог без пагинации, один фильм на строку
+            return StreamingHttpResponse(
+                stream_ndjson(self.get_queryset(), self.stream_chunk_size),
+                content_type=NDJSON_CONTENT_TYPE,
+            )
+        return super().get(request, *args, **kwargs)
+
+    def render_to_response(self, context, **response_kwargs):
+        if self.is_streaming() and 'cursor' not in self.request.GET:
+            return StreamingHttpResponse(
+                stream_json(context, self.stream_chunk_size),
+                content_type=JSON_CONTENT_TYPE,
+            )
+        return super().render_to_response(context, **response_kwargs)
+
     def get_context_data(self, *, object_list=None, **kwargs):
+        if 'cursor' in self.request.GET:
+            return self.get_cursor_context_data()
         queryset = self.get_queryset()
         paginator, page, queryset, is_paginated = self.paginate_queryset(
             queryset,
-            self.paginate_by
+            self.get_paginate_by()
         )
         prev = page.previous_page_number() if page.has_previous() else None
         next = page.next_page_number() if page.has_next() else None
@@ -56,17 +187,43 @@ class MoviesListApi(MoviesApiMixin, BaseListView):
             'total_pages': paginator.num_pages,
             'prev': prev,
             'next': next,
-            'results': list(queryset)
+            # При ?stream= страница читается уже во время отправки ответа
+            'results': queryset if self.is_streaming() else list(queryset)
+        }
+
+    def get_cursor_context_data(self):
+        """
+        Постраничный вывод по курсору: ?cursor= (пустой — первая страница)
+        и ?sort=modified|title. prev и next — курсоры соседних страниц.
+        """
+        sort = self.request.GET.get('sort', 'modified')
+        if sort not in self.cursor_sort_fields:
+            raise BadRequest('unknown sort')
+        extra_fields = () if sort in self.fields else (sort,)
+        paginator = KeysetPaginator(
+            self.get_queryset(extra_fields), sort, self.get_paginate_by()
+        )
+        results, prev, next = paginator.page(self.request.GET['cursor'])
+        for row in results:
+            for field in extra_fields:
+                del row[field]
+        count = self.paginator_class(self.model.objects.all(), 1).count
+        return {
+            'count': count,
+            'prev': prev,
+            'next': next,
+            'results': results
         }
 
 
 class MoviesDetailApi(MoviesApiMixin, BaseDetailView):
 
+    def get_cache_key(self) -> str:
+        return detail_key(self.kwargs['pk'])
+
     def get_queryset(self):
         qs = self.model.objects.filter(pk=self.kwargs['pk'])
-        qs = qs.values(
-            'id', 'title', 'description', 'creation_date', 'rating', 'type'
-        )
+        qs = qs.values(*self.fields)
         qs = self.get_queryset_annotate(qs)
         return qs
 
@@ -6,3 +6,7 @@ class MoviesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'movies'
     verbose_name = _('movies')
+
+    def ready(self):
+        # Сброс кеша API фильмов при изменении данных
+        from movies import signals  # noqa: F401
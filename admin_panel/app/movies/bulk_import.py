@@ -0,0 +1,391 @@
+"""
+Массовая загрузка каталога в таблицы content через COPY.
+
+Каждая таблица загружается в два шага: COPY во временную staging-таблицу
+и один INSERT ... SELECT ... ON CONFLICT в основную таблицу. Строки
+источника не проходят через ORM и передаются в Postgres потоком.
+"""
+import csv
+import io
+import json
+import os
+import random
+import sqlite3
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from django.db import DatabaseError, connection, connections, transaction
+from psycopg2 import errorcodes
+
+from movies.models import (
+    Filmwork, Genre, GenreFilmwork, Person, PersonFilmWork
+)
+
+# Таблицы загружаются по этапам: внутри этапа параллельно,
+# связи — только после фильмов, жанров и персон (внешние ключи)
+STAGES = (
+    (Filmwork, Genre, Person),
+    (GenreFilmwork, PersonFilmWork),
+)
+
+# Названия колонок в источниках, которые отличаются от наших
+COLUMN_ALIASES = {
+    'created_at': 'created',
+    'updated_at': 'modified',
+}
+
+TIMESTAMP_COLUMNS = ('created', 'modified')
+
+FORMATS = ('csv', 'sqlite', 'ndjson')
+
+# Сколько раз загружать таблицу, транзакцию которой откатил deadlock
+DEADLOCK_RETRIES = 3
+
+
+class LoadResult(NamedTuple):
+    table: str
+    copied: int
+    upserted: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.copied / self.seconds if self.seconds else 0.0
+
+
+def table_name(model) -> str:
+    # 'content"."film_work' -> 'film_work'
+    return model._meta.db_table.split('"."')[-1]
+
+
+def quoted_table(model) -> str:
+    return f'"{model._meta.db_table}"'
+
+
+def model_columns(model) -> List[str]:
+    return [field.column for field in model._meta.concrete_fields]
+
+
+def conflict_columns(model) -> List[str]:
+    # Для связей конфликтом считается повтор естественного ключа,
+    # для остальных таблиц — повтор id
+    if model._meta.unique_together:
+        fields = model._meta.unique_together[0]
+        return [model._meta.get_field(name).column for name in fields]
+    return [model._meta.pk.column]
+
+
+def normalize_columns(model, columns: Iterable[str]) -> List[str]:
+    known = set(model_columns(model))
+    return [
+        COLUMN_ALIASES.get(column, column)
+        for column in columns
+        if COLUMN_ALIASES.get(column, column) in known
+    ]
+
+
+class CsvStream(io.RawIOBase):
+    """
+    Файлоподобный объект для COPY FROM STDIN: строки превращаются в CSV
+    по мере чтения, поэтому источник не загружается в память целиком.
+    """
+
+    def __init__(self, rows: Iterable[Iterable]):
+        super().__init__()
+        self.rows = iter(rows)
+        self.text = io.StringIO()
+        self.writer = csv.writer(self.text)
+        self.data = bytearray()
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self.data) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+            self.data += self.text.getvalue().encode()
+            self.text.seek(0)
+            self.text.truncate()
+        if size < 0:
+            size = len(self.data)
+        chunk = bytes(self.data[:size])
+        del self.data[:size]
+        return chunk
+
+
+class Source:
+    """Источник строк таблицы: колонки и поток для COPY (формат CSV)."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def open(self, model) -> Optional[Tuple[List[str], io.IOBase, bool]]:
+        """
+        Возвращает (колонки, поток, есть ли строка заголовка)
+        или None, если таблицы в источнике нет.
+        """
+        raise NotImplementedError
+
+
+class CsvSource(Source):
+    # Каталог с файлами <таблица>.csv, первая строка — заголовок
+
+    def open(self, model):
+        path = os.path.join(self.path, f'{table_name(model)}.csv')
+        if not os.path.exists(path):
+            return None
+        stream = open(path, newline='', encoding='utf-8')
+        header = next(csv.reader(stream))
+        columns = [COLUMN_ALIASES.get(column, column) for column in header]
+        unknown = set(columns) - set(model_columns(model))
+        if unknown:
+            stream.close()
+            raise ValueError(
+                f'{path}: unknown columns {", ".join(sorted(unknown))}'
+            )
+        stream.seek(0)
+        return columns, stream, True
+
+
+class SqliteSource(Source):
+    # Файл SQLite с таблицами тех же названий
+
+    def rows(self, model, columns: List[str]) -> Iterator[tuple]:
+        # Соединение открывается в потоке, который читает строки
+        db = sqlite3.connect(self.path)
+        try:
+            cursor = db.execute(f'SELECT * FROM {table_name(model)}')
+            names = [
+                COLUMN_ALIASES.get(column[0], column[0])
+                for column in cursor.description
+            ]
+            positions = [names.index(column) for column in columns]
+            for row in cursor:
+                yield tuple(row[position] for position in positions)
+        finally:
+            db.close()
+
+    def open(self, model):
+        db = sqlite3.connect(self.path)
+        try:
+            description = db.execute(
+                f'SELECT * FROM {table_name(model)} LIMIT 0'
+            ).description
+        except sqlite3.OperationalError:
+            return None
+        finally:
+            db.close()
+        columns = normalize_columns(
+            model, [column[0] for column in description]
+        )
+        return columns, CsvStream(self.rows(model, columns)), False
+
+
+class NdjsonSource(Source):
+    # Каталог с файлами <таблица>.ndjson, один объект json на строку
+
+    def rows(self, stream, first: dict, keys: List[str]) -> Iterator[tuple]:
+        with stream:
+            yield tuple(first.get(key) for key in keys)
+            for line in stream:
+                if line.strip():
+                    item = json.loads(line)
+                    yield tuple(item.get(key) for key in keys)
+
+    def open(self, model):
+        path = os.path.join(self.path, f'{table_name(model)}.ndjson')
+        if not os.path.exists(path):
+            return None
+        stream = open(path, encoding='utf-8')
+        first_line = stream.readline()
+        if not first_line.strip():
+            stream.close()
+            return None
+        first = json.loads(first_line)
+        known = set(model_columns(model))
+        keys = [
+            key for key in first
+            if COLUMN_ALIASES.get(key, key) in known
+        ]
+        columns = [COLUMN_ALIASES.get(key, key) for key in keys]
+        return columns, CsvStream(self.rows(stream, first, keys)), False
+
+
+def get_source(source_format: str, path: str) -> Source:
+    sources = {
+        'csv': CsvSource,
+        'sqlite': SqliteSource,
+        'ndjson': NdjsonSource,
+    }
+    return sources[source_format](path)
+
+
+def column_defaults(model) -> Dict[str, object]:
+    # Значения по умолчанию обязательных колонок (например, film_work.type):
+    # подставляются, если в источнике колонки нет или значение пустое
+    defaults = {}
+    for field in model._meta.concrete_fields:
+        if field.primary_key or field.null or not field.has_default():
+            continue
+        if field.column in TIMESTAMP_COLUMNS:
+            continue
+        defaults[field.column] = field.get_db_prep_save(
+            field.get_default(), connection
+        )
+    return defaults
+
+
+def upsert_sql(model, staging: str, columns: List[str]) -> Tuple[str, list]:
+    """INSERT ... SELECT из staging-таблицы и его параметры."""
+    target = quoted_table(model)
+    keys = conflict_columns(model)
+    insert_columns = list(columns)
+    select_columns = list(columns)
+    # Позиция в select_columns -> параметр запроса
+    params = {}
+    if 'id' not in columns:
+        # Источники связей часто не содержат собственного id строки
+        insert_columns.append('id')
+        select_columns.append('gen_random_uuid()')
+    for column in TIMESTAMP_COLUMNS:
+        if column in columns:
+            index = columns.index(column)
+            select_columns[index] = f'COALESCE({column}, now())'
+        else:
+            insert_columns.append(column)
+            select_columns.append('now()')
+    if 'modified' in columns:
+        # ETL читает изменения начиная со своей позиции по modified:
+        # строка с прежней датой из источника оказалась бы позади неё
+        # и не попала бы в Elasticsearch. GREATEST пропускает NULL
+        select_columns[columns.index('modified')] = 'GREATEST(modified, now())'
+    for column, default in column_defaults(model).items():
+        if column in columns:
+            index = columns.index(column)
+            select_columns[index] = f'COALESCE({column}, %s)'
+        else:
+            index = len(select_columns)
+            insert_columns.append(column)
+            select_columns.append('%s')
+        params[index] = default
+    updates = [
+        f'{column} = EXCLUDED.{column}'
+        for column in columns
+        if column not in keys and column != 'created'
+    ]
+    if 'modified' not in columns:
+        updates.append('modified = now()')
+    # Связь с тем же естественным ключом уже есть, менять в ней нечего
+    action = 'DO NOTHING'
+    if updates and not model._meta.unique_together:
+        action = 'DO UPDATE SET ' + ', '.join(updates)
+    # DISTINCT ON: ON CONFLICT DO UPDATE не может изменить одну строку
+    # дважды, если ключ повторяется в самом источнике
+    sql = (
+        f'INSERT INTO {target} ({", ".join(insert_columns)}) '
+        f'SELECT DISTINCT ON ({", ".join(keys)}) {", ".join(select_columns)} '
+        f'FROM {staging} '
+        f'ON CONFLICT ({", ".join(keys)}) {action}'
+    )
+    return sql, [params[index] for index in sorted(params)]
+
+
+def load_table(source: Source, model) -> Optional[LoadResult]:
+    """
+    Загружает одну таблицу. Выполняется в отдельном потоке
+    со своим соединением с базой.
+    """
+    opened = source.open(model)
+    if opened is None:
+        return None
+    columns, stream, header = opened
+    staging = f'staging_{table_name(model)}'
+    start = time.perf_counter()
+    try:
+        with connection.cursor() as cursor:
+            # Только колонки источника и без NOT NULL (CREATE TABLE AS
+            # не копирует ограничения): пустые id, type, created и т.п.
+            # заполняются уже в upsert_sql
+            cursor.execute(
+                f'CREATE TEMP TABLE {staging} ON COMMIT DROP AS '
+                f'SELECT {", ".join(columns)} FROM {quoted_table(model)} '
+                f'WITH NO DATA'
+            )
+            options = 'FORMAT csv, HEADER true' if header else 'FORMAT csv'
+            # Django оборачивает курсор psycopg2, copy_expert есть у исходного
+            cursor.cursor.copy_expert(
+                f'COPY {staging} ({", ".join(columns)}) FROM STDIN '
+                f'WITH ({options})',
+                stream,
+            )
+            copied = cursor.cursor.rowcount
+            cursor.execute(*upsert_sql(model, staging, columns))
+            upserted = cursor.rowcount
+            cursor.execute(f'ANALYZE {quoted_table(model)}')
+    finally:
+        stream.close()
+    return LoadResult(
+        table_name(model), copied, upserted, time.perf_counter() - start
+    )
+
+
+def is_deadlock(err: DatabaseError) -> bool:
+    return getattr(err.__cause__, 'pgcode', None) == errorcodes.DEADLOCK_DETECTED
+
+
+def load_table_in_thread(source: Source, model) -> Optional[LoadResult]:
+    """
+    У каждого потока своё соединение Django; транзакция на таблицу.
+    Триггеры 0002 обновляют film_work при загрузке связей, персон
+    и жанров, поэтому параллельные транзакции могут заблокировать друг
+    друга. Postgres откатывает одну из них, и таблица загружается
+    заново: источник открывается с начала.
+    """
+    try:
+        for attempt in range(1, DEADLOCK_RETRIES + 1):
+            try:
+                with transaction.atomic():
+                    return load_table(source, model)
+            except DatabaseError as err:
+                if not is_deadlock(err) or attempt == DEADLOCK_RETRIES:
+                    raise
+                time.sleep(random.uniform(0, attempt))
+    finally:
+        connections.close_all()
+
+
+def secondary_indexes(model) -> Dict[str, str]:
+    """
+    Индексы таблицы, которые можно удалить на время загрузки:
+    все, кроме первичного ключа и ограничений уникальности
+    (они нужны ON CONFLICT). Возвращает имя -> CREATE INDEX.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT i.indexname, i.indexdef
+            FROM pg_indexes i
+            WHERE i.schemaname = 'content' AND i.tablename = %s
+              AND NOT EXISTS (
+                  SELECT 1 FROM pg_constraint c
+                  WHERE c.conindid = format('content.%%I', i.indexname)::regclass
+              )
+            """,
+            [table_name(model)],
+        )
+        return dict(cursor.fetchall())
+
+
+def drop_indexes(indexes: Dict[str, str]):
+    with connection.cursor() as cursor:
+        for name in indexes:
+            cursor.execute(f'DROP INDEX IF EXISTS content."{name}"')
+
+
+def create_indexes(indexes: Dict[str, str]):
+    with connection.cursor() as cursor:
+        for definition in indexes.values():
+            cursor.execute(definition)
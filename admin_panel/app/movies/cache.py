@@ -0,0 +1,76 @@
+import hashlib
+import time
+from typing import Iterable
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Версия списков фильмов. Любое изменение её увеличивает, и все закешированные
+# страницы списка перестают читаться (и истекают по TIMEOUT)
+LIST_VERSION_KEY = 'movies:list:version'
+
+# Ответы по фильму версионируются так же, но у каждого фильма своя версия.
+# Простое удаление ключа не спасает от гонки: запрос, прочитавший фильм
+# до фиксации изменений, записал бы старый ответ уже после удаления.
+# С версиями он запишет его под старым ключом, который больше не читается
+
+
+def new_version() -> int:
+    # Версия заново созданного (или вытесненного) ключа не совпадает
+    # ни с одной прежней, поэтому старые ответы не оживут
+    return time.time_ns()
+
+
+def get_version(key: str) -> int:
+    return cache.get_or_set(key, new_version, timeout=None)
+
+
+def bump_version(key: str):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Ключа ещё нет (или он вытеснен)
+        cache.set(key, new_version(), timeout=None)
+
+
+def detail_version_key(film_id) -> str:
+    return f'movies:detail:version:{film_id}'
+
+
+def detail_key(film_id) -> str:
+    version = get_version(detail_version_key(film_id))
+    return f'movies:detail:{film_id}:{version}'
+
+
+def list_version() -> int:
+    return get_version(LIST_VERSION_KEY)
+
+
+def list_key(query_string: str) -> str:
+    # Параметры запроса сортируются: ?a=1&b=2 и ?b=2&a=1 — одна страница
+    query = '&'.join(sorted(query_string.split('&')))
+    digest = hashlib.md5(query.encode()).hexdigest()
+    return f'movies:list:{list_version()}:{digest}'
+
+
+def bump_list_version():
+    bump_version(LIST_VERSION_KEY)
+
+
+def invalidate_films(film_ids: Iterable):
+    """Сбрасывает ответы по изменённым фильмам и все страницы списка."""
+    keys = [detail_version_key(film_id) for film_id in set(film_ids)]
+
+    def invalidate():
+        for key in keys:
+            bump_version(key)
+        bump_list_version()
+
+    # После фиксации транзакции, иначе параллельный запрос успеет
+    # закешировать ещё не изменённые данные под новой версией
+    transaction.on_commit(invalidate)
+
+
+def invalidate_all():
+    # Для изменений в обход ORM (массовая загрузка)
+    cache.clear()
@@ -0,0 +1,125 @@
+import json
+import statistics
+import time
+
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from movies.api.v1.views import MoviesApiMixin
+from movies.models import (
+    Filmwork, Genre, GenreFilmwork, Person, PersonFilmWork
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+def join_annotate(queryset):
+    # Прежний вариант: ArrayAgg по общему join жанров и персон
+    def by_role(role):
+        return ArrayAgg(
+            'persons__full_name',
+            filter=Q(personfilmwork__role=role),
+            distinct=True
+        )
+
+    return queryset.annotate(
+        genres=ArrayAgg('genres__name', distinct=True),
+        actors=by_role('actor'),
+        directors=by_role('director'),
+        writers=by_role('writer')
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время запросов API фильмов (ArrayAgg по join '
+        'и подзапросы) на синтетических фильмах с большим составом. '
+        'Данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--films', type=int, default=50)
+        parser.add_argument('--cast', type=int, default=300)
+        parser.add_argument('--genres', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        report = {}
+        try:
+            with transaction.atomic():
+                film_ids = self.create_catalog(
+                    options['films'], options['cast'], options['genres']
+                )
+                mixin = MoviesApiMixin()
+                report = {
+                    'films': options['films'],
+                    'cast': options['cast'],
+                    'genres': options['genres'],
+                    'join': self.measure(
+                        join_annotate, film_ids, options['repeat']
+                    ),
+                    'subquery': self.measure(
+                        mixin.get_queryset_annotate, film_ids, options['repeat']
+                    ),
+                }
+                raise Rollback
+        except Rollback:
+            pass
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def create_catalog(self, films: int, cast: int, genres: int):
+        genre_objs = Genre.objects.bulk_create(
+            Genre(name=f'bench genre {i}') for i in range(genres)
+        )
+        person_objs = Person.objects.bulk_create(
+            Person(full_name=f'bench person {i}') for i in range(cast)
+        )
+        film_objs = Filmwork.objects.bulk_create(
+            Filmwork(title=f'bench film {i}', rating=i % 10)
+            for i in range(films)
+        )
+        # Каждый фильм получает весь состав: немного режиссёров
+        # и сценаристов, остальные — актёры
+        roles = ['director'] * 2 + ['writer'] * 8 + ['actor'] * 90
+        for film in film_objs:
+            GenreFilmwork.objects.bulk_create(
+                GenreFilmwork(film_work=film, genre=genre)
+                for genre in genre_objs
+            )
+            PersonFilmWork.objects.bulk_create(
+                PersonFilmWork(
+                    film_work=film, person=person, role=roles[i % len(roles)]
+                )
+                for i, person in enumerate(person_objs)
+            )
+        return [film.id for film in film_objs]
+
+    def measure(self, annotate, film_ids, repeat: int) -> dict:
+        fields = MoviesApiMixin.fields
+        page = annotate(
+            Filmwork.objects.filter(id__in=film_ids).values(*fields)
+        )
+        detail = annotate(
+            Filmwork.objects.filter(pk=film_ids[0]).values(*fields)
+        )
+        return {
+            'list_ms': self.timings(lambda: list(page.all()), repeat),
+            'detail_ms': self.timings(lambda: list(detail.all()), repeat),
+        }
+
+    @staticmethod
+    def timings(run, repeat: int) -> dict:
+        run()  # прогрев кеша страниц Postgres
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            samples.append((time.perf_counter() - start) * 1000)
+        return {
+            'median': round(statistics.median(samples), 2),
+            'max': round(max(samples), 2),
+        }
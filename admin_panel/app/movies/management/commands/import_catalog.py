@@ -0,0 +1,85 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from movies import bulk_import
+from movies.cache import invalidate_all
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает каталог (CSV, SQLite или NDJSON) в таблицы content '
+        'через COPY и staging-таблицы с upsert по ключу.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Каталог с файлами <таблица>.csv/.ndjson или файл SQLite'
+        )
+        parser.add_argument(
+            '--format', choices=bulk_import.FORMATS, default='csv'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=3,
+            help='Сколько таблиц одного этапа загружать параллельно'
+        )
+        parser.add_argument(
+            '--defer-indexes', action='store_true',
+            help='Удалить вторичные индексы на время загрузки '
+                 'и построить их заново в конце'
+        )
+
+    def handle(self, *args, **options):
+        source = bulk_import.get_source(options['format'], options['path'])
+        models = [model for stage in bulk_import.STAGES for model in stage]
+        deferred = {}
+        if options['defer_indexes']:
+            for model in models:
+                deferred.update(bulk_import.secondary_indexes(model))
+            bulk_import.drop_indexes(deferred)
+            self.stdout.write(f'Dropped {len(deferred)} indexes')
+
+        start = time.perf_counter()
+        total = 0
+        try:
+            for stage in bulk_import.STAGES:
+                with ThreadPoolExecutor(options['workers']) as executor:
+                    results = list(executor.map(
+                        lambda model: bulk_import.load_table_in_thread(
+                            source, model
+                        ),
+                        stage,
+                    ))
+                for model, result in zip(stage, results):
+                    if result is None:
+                        self.stdout.write(
+                            f'{bulk_import.table_name(model)}: not in source'
+                        )
+                        continue
+                    total += result.copied
+                    self.stdout.write(
+                        f'{result.table}: {result.copied} rows copied, '
+                        f'{result.upserted} upserted in '
+                        f'{result.seconds:.1f}s '
+                        f'({result.rows_per_second:.0f} rows/s)'
+                    )
+        except ValueError as err:
+            raise CommandError(str(err))
+        finally:
+            if deferred:
+                index_start = time.perf_counter()
+                bulk_import.create_indexes(deferred)
+                self.stdout.write(
+                    f'Rebuilt {len(deferred)} indexes in '
+                    f'{time.perf_counter() - index_start:.1f}s'
+                )
+
+        # Загрузка идёт в обход ORM и сигналов
+        invalidate_all()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {total} rows in {elapsed:.1f}s '
+            f'({total / elapsed if elapsed else 0:.0f} rows/s)'
+        ))
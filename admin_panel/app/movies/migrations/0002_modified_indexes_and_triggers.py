@@ -0,0 +1,130 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+# Изменения связей, персон и жанров обновляют film_work.modified, поэтому
+# ETL может находить изменённые фильмы одним диапазонным запросом по индексу
+# film_work.modified.
+# Триггеры уровня оператора (FOR EACH STATEMENT) получают все изменённые
+# строки через transition tables и обновляют фильмы одним UPDATE на оператор.
+# Transition tables нельзя объявить для триггера на несколько событий,
+# поэтому на каждое событие свой триггер с общей функцией.
+TRIGGERS_SQL = """
+CREATE OR REPLACE FUNCTION content.touch_film_work_by_link() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE content.film_work SET modified = now()
+        WHERE id IN (SELECT film_work_id FROM new_rows);
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE content.film_work SET modified = now()
+        WHERE id IN (SELECT film_work_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION content.touch_film_work_by_person() RETURNS trigger AS $$
+BEGIN
+    UPDATE content.film_work SET modified = now()
+    WHERE id IN (
+        SELECT pfw.film_work_id
+        FROM content.person_film_work pfw
+        JOIN new_rows n ON n.id = pfw.person_id
+        JOIN old_rows o ON o.id = n.id
+        WHERE n.full_name IS DISTINCT FROM o.full_name
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION content.touch_film_work_by_genre() RETURNS trigger AS $$
+BEGIN
+    UPDATE content.film_work SET modified = now()
+    WHERE id IN (
+        SELECT gfw.film_work_id
+        FROM content.genre_film_work gfw
+        JOIN new_rows n ON n.id = gfw.genre_id
+        JOIN old_rows o ON o.id = n.id
+        WHERE n.name IS DISTINCT FROM o.name
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER person_film_work_insert AFTER INSERT ON content.person_film_work
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION content.touch_film_work_by_link();
+CREATE TRIGGER person_film_work_update AFTER UPDATE ON content.person_film_work
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION content.touch_film_work_by_link();
+CREATE TRIGGER person_film_work_delete AFTER DELETE ON content.person_film_work
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION content.touch_film_work_by_link();
+
+CREATE TRIGGER genre_film_work_insert AFTER INSERT ON content.genre_film_work
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION content.touch_film_work_by_link();
+CREATE TRIGGER genre_film_work_update AFTER UPDATE ON content.genre_film_work
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION content.touch_film_work_by_link();
+CREATE TRIGGER genre_film_work_delete AFTER DELETE ON content.genre_film_work
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION content.touch_film_work_by_link();
+
+CREATE TRIGGER person_update AFTER UPDATE ON content.person
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION content.touch_film_work_by_person();
+
+CREATE TRIGGER genre_update AFTER UPDATE ON content.genre
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION content.touch_film_work_by_genre();
+"""
+
+DROP_TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS person_film_work_insert ON content.person_film_work;
+DROP TRIGGER IF EXISTS person_film_work_update ON content.person_film_work;
+DROP TRIGGER IF EXISTS person_film_work_delete ON content.person_film_work;
+DROP TRIGGER IF EXISTS genre_film_work_insert ON content.genre_film_work;
+DROP TRIGGER IF EXISTS genre_film_work_update ON content.genre_film_work;
+DROP TRIGGER IF EXISTS genre_film_work_delete ON content.genre_film_work;
+DROP TRIGGER IF EXISTS person_update ON content.person;
+DROP TRIGGER IF EXISTS genre_update ON content.genre;
+DROP FUNCTION IF EXISTS content.touch_film_work_by_link();
+DROP FUNCTION IF EXISTS content.touch_film_work_by_person();
+DROP FUNCTION IF EXISTS content.touch_film_work_by_genre();
+"""
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY не выполняется внутри транзакции,
+    # зато не блокирует запись в таблицы на время построения индекса
+    atomic = False
+
+    dependencies = [
+        ('movies', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='filmwork',
+            index=models.Index(fields=['modified'], name='film_work_modified_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='genre',
+            index=models.Index(fields=['modified'], name='genre_modified_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='person',
+            index=models.Index(fields=['modified'], name='person_modified_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='genrefilmwork',
+            index=models.Index(fields=['genre', 'film_work'], name='gfw_genre_film_work_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='personfilmwork',
+            index=models.Index(fields=['person', 'role'], name='pfw_person_role_idx'),
+        ),
+        migrations.RunSQL(TRIGGERS_SQL, DROP_TRIGGERS_SQL),
+    ]
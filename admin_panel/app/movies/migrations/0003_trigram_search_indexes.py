@@ -0,0 +1,31 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Поиск в админке (icontains) строит условие UPPER(поле::text) LIKE ...,
+# поэтому индексируется то же выражение. Индексы по выражению с классом
+# операторов в Django 3.2 не описываются в Meta.indexes, поэтому они
+# создаются здесь через SQL
+TRIGRAM_INDEXES = (
+    ('film_work_title_trgm_idx', 'film_work', 'title'),
+    ('person_full_name_trgm_idx', 'person', 'full_name'),
+)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('movies', '0002_modified_indexes_and_triggers'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+    ] + [
+        migrations.RunSQL(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} '
+            f'ON content.{table} USING gin (UPPER({column}::text) gin_trgm_ops)',
+            f'DROP INDEX CONCURRENTLY IF EXISTS content.{name}',
+        )
+        for name, table, column in TRIGRAM_INDEXES
+    ]
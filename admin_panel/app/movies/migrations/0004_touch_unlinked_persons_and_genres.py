@@ -0,0 +1,62 @@
+from django.db import migrations
+
+# Документы персон и жанров в ETL хранят id своих фильмов. Когда персону
+# или жанр отвязывают от фильма, их документ тоже нужно пересобрать,
+# но изменённый фильм о прежних связях уже ничего не знает. Поэтому
+# при изменении и удалении связей обновляется modified и у персон
+# (жанров) из удалённых строк: ETL найдёт их своим проходом по person
+# (genre). Триггеры на person и genre сравнивают только имена, так что
+# обновление modified не затрагивает фильмы повторно.
+# Функция общая для person_film_work и genre_film_work; PL/pgSQL готовит
+# запрос при первом выполнении, поэтому ветка с колонкой другой таблицы
+# не мешает
+TOUCH_LINK_SQL = """
+CREATE OR REPLACE FUNCTION content.touch_film_work_by_link() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE content.film_work SET modified = now()
+        WHERE id IN (SELECT film_work_id FROM new_rows);
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE content.film_work SET modified = now()
+        WHERE id IN (SELECT film_work_id FROM old_rows);
+        IF TG_TABLE_NAME = 'person_film_work' THEN
+            UPDATE content.person SET modified = now()
+            WHERE id IN (SELECT person_id FROM old_rows);
+        ELSE
+            UPDATE content.genre SET modified = now()
+            WHERE id IN (SELECT genre_id FROM old_rows);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Прежняя версия функции из 0002
+REVERSE_TOUCH_LINK_SQL = """
+CREATE OR REPLACE FUNCTION content.touch_film_work_by_link() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE content.film_work SET modified = now()
+        WHERE id IN (SELECT film_work_id FROM new_rows);
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE content.film_work SET modified = now()
+        WHERE id IN (SELECT film_work_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0003_trigram_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(TOUCH_LINK_SQL, REVERSE_TOUCH_LINK_SQL),
+    ]
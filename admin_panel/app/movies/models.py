@@ -30,6 +30,9 @@ class Genre(UUIDMixin, TimeStampedMixin):
         db_table = "content\".\"genre"
         verbose_name = _('genre')
         verbose_name_plural = _('genres')
+        indexes = [
+            models.Index(fields=['modified'], name='genre_modified_idx'),
+        ]
 
 
 class Person(UUIDMixin, TimeStampedMixin):
@@ -42,6 +45,9 @@ class Person(UUIDMixin, TimeStampedMixin):
         db_table = "content\".\"person"
         verbose_name = _('person')
         verbose_name_plural = _('persons')
+        indexes = [
+            models.Index(fields=['modified'], name='person_modified_idx'),
+        ]
 
 
 class Filmwork(UUIDMixin, TimeStampedMixin):
@@ -78,6 +84,9 @@ class Filmwork(UUIDMixin, TimeStampedMixin):
         db_table = "content\".\"film_work"
         verbose_name = _('filmwork')
         verbose_name_plural = _('filmwork')
+        indexes = [
+            models.Index(fields=['modified'], name='film_work_modified_idx'),
+        ]
 
 
 class GenreFilmwork(UUIDMixin, TimeStampedMixin):
@@ -87,6 +96,9 @@ class GenreFilmwork(UUIDMixin, TimeStampedMixin):
     class Meta:
         db_table = "content\".\"genre_film_work"
         unique_together = ['film_work', 'genre']
+        indexes = [
+            models.Index(fields=['genre', 'film_work'], name='gfw_genre_film_work_idx'),
+        ]
 
 
 class PersonFilmWork(UUIDMixin, TimeStampedMixin):
@@ -98,3 +110,6 @@ class PersonFilmWork(UUIDMixin, TimeStampedMixin):
     class Meta:
         db_table = "content\".\"person_film_work"
         unique_together = ['film_work', 'person', 'role']
+        indexes = [
+            models.Index(fields=['person', 'role'], name='pfw_person_role_idx'),
+        ]
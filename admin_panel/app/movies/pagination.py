@@ -0,0 +1,188 @@
+import base64
+import json
+from typing import Any, List, Optional, Tuple
+
+from django.core.exceptions import BadRequest, ValidationError
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+
+def estimate_count(model) -> int:
+    """
+    Примерное число строк таблицы по статистике планировщика
+    (pg_class.reltuples) вместо COUNT(*) по всей таблице.
+    Для таблицы, по которой ещё не собрана статистика, возвращает -1
+    (Postgres 14+) или 0 (Postgres 13 и старше).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [f'"{model._meta.db_table}"'],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else -1
+
+
+class EstimatedPage(Page):
+    # Есть ли следующая страница, известно по самим строкам, а не по оценке
+
+    def __init__(self, object_list, number, paginator, has_more: bool):
+        super().__init__(object_list, number, paginator)
+        self.has_more = has_more
+
+    def has_next(self):
+        return self.has_more
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator, который для queryset без фильтров берёт число строк
+    из статистики Postgres. С фильтрами считает точно, как обычно.
+
+    Оценка используется только для count и num_pages, которые видит
+    пользователь. Страницы по ней не обрезаются: оценка может быть меньше
+    реального числа строк, а последние строки должны оставаться доступны.
+    """
+
+    @cached_property
+    def estimate(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None or query.where:
+            return None
+        estimate = estimate_count(self.object_list.model)
+        # 0 у таблицы, по которой не собрана статистика, ничего не значит
+        return estimate if estimate > 0 else None
+
+    @cached_property
+    def count(self):
+        if self.estimate is not None:
+            return self.estimate
+        return super().count
+
+    def validate_number(self, number):
+        if self.estimate is None:
+            return super().validate_number(number)
+        # Как в Paginator, но без сравнения с num_pages по оценке
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        return number
+
+    def page(self, number):
+        if self.estimate is None:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        # Пустая страница после последней — ошибка, как и в Paginator
+        if number > 1 and not self.object_list[bottom:bottom + 1].exists():
+            raise EmptyPage(_('That page contains no results'))
+        return EstimatedPage(
+            self.object_list[bottom:top],
+            number,
+            self,
+            has_more=self.object_list[top:top + 1].exists(),
+        )
+
+
+class KeysetPaginator:
+    """
+    Постраничный вывод по ключу (keyset): следующая страница выбирается
+    условием (field, id) > (значение, id) последней строки, а не OFFSET,
+    поэтому любая страница стоит столько же, сколько первая.
+    Курсоры непрозрачны для клиента: это base64 от значения ключа,
+    id строки и направления.
+    Строки с field = NULL идут первыми.
+    """
+
+    NEXT = 'next'
+    PREV = 'prev'
+
+    def __init__(self, queryset, field: str, per_page: int):
+        self.queryset = queryset
+        self.field = field
+        self.per_page = per_page
+
+    def encode_cursor(self, row: dict, direction: str) -> str:
+        value = row[self.field]
+        # DjangoJSONEncoder обрезает datetime до миллисекунд, тогда строка
+        # на границе страницы попала бы и на следующую страницу
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        data = json.dumps(
+            [value, row['id'], direction], cls=DjangoJSONEncoder
+        )
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, cursor: str) -> Tuple[Any, Any, str]:
+        # Курсор приходит от клиента: любая ошибка в нём — 400, в том числе
+        # значения, которые упали бы только в запросе (uuid, дата)
+        try:
+            value, pk, direction = json.loads(base64.urlsafe_b64decode(cursor))
+        except (ValueError, TypeError):
+            raise BadRequest('invalid cursor')
+        if direction not in (self.NEXT, self.PREV):
+            raise BadRequest('invalid cursor')
+        meta = self.queryset.model._meta
+        try:
+            pk = meta.pk.to_python(pk)
+            if value is not None:
+                value = meta.get_field(self.field).to_python(value)
+        except (ValidationError, TypeError):
+            raise BadRequest('invalid cursor')
+        if pk is None:
+            raise BadRequest('invalid cursor')
+        return value, pk, direction
+
+    def after(self, value, pk) -> Q:
+        field = self.field
+        if value is None:
+            return (
+                Q(**{f'{field}__isnull': True, 'id__gt': pk})
+                | Q(**{f'{field}__isnull': False})
+            )
+        return Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': pk})
+
+    def before(self, value, pk) -> Q:
+        field = self.field
+        if value is None:
+            return Q(**{f'{field}__isnull': True, 'id__lt': pk})
+        return (
+            Q(**{f'{field}__lt': value})
+            | Q(**{field: value, 'id__lt': pk})
+            | Q(**{f'{field}__isnull': True})
+        )
+
+    def page(self, cursor: Optional[str]) -> Tuple[List[dict], Optional[str], Optional[str]]:
+        """Возвращает строки страницы и курсоры предыдущей и следующей."""
+        queryset = self.queryset
+        direction = self.NEXT
+        if cursor:
+            value, pk, direction = self.decode_cursor(cursor)
+            condition = self.after if direction == self.NEXT else self.before
+            queryset = queryset.filter(condition(value, pk))
+        if direction == self.NEXT:
+            queryset = queryset.order_by(F(self.field).asc(nulls_first=True), 'id')
+        else:
+            queryset = queryset.order_by(F(self.field).desc(nulls_last=True), '-id')
+        # Одна лишняя строка показывает, есть ли страница дальше
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == self.NEXT:
+            has_next, has_prev = has_more, bool(cursor)
+        else:
+            rows.reverse()
+            has_next, has_prev = True, has_more
+        prev = self.encode_cursor(rows[0], self.PREV) if rows and has_prev else None
+        next = self.encode_cursor(rows[-1], self.NEXT) if rows and has_next else None
+        return rows, prev, next
@@ -0,0 +1,59 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from movies.cache import invalidate_films
+from movies.models import (
+    Filmwork, Genre, GenreFilmwork, Person, PersonFilmWork
+)
+
+
+@receiver(post_save, sender=Filmwork)
+@receiver(post_delete, sender=Filmwork)
+def filmwork_changed(sender, instance, **kwargs):
+    invalidate_films([instance.pk])
+
+
+@receiver(post_save, sender=GenreFilmwork)
+@receiver(post_delete, sender=GenreFilmwork)
+@receiver(post_save, sender=PersonFilmWork)
+@receiver(post_delete, sender=PersonFilmWork)
+def link_changed(sender, instance, **kwargs):
+    invalidate_films([instance.film_work_id])
+
+
+@receiver(post_save, sender=Person)
+def person_changed(sender, instance, **kwargs):
+    # Удаление персоны каскадно удаляет её связи, это обработает link_changed
+    invalidate_films(
+        PersonFilmWork.objects
+        .filter(person=instance)
+        .values_list('film_work_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Genre)
+def genre_changed(sender, instance, **kwargs):
+    invalidate_films(
+        GenreFilmwork.objects
+        .filter(genre=instance)
+        .values_list('film_work_id', flat=True)
+    )
+
+
+@receiver(m2m_changed, sender=GenreFilmwork)
+@receiver(m2m_changed, sender=PersonFilmWork)
+def film_links_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # film.genres.add(...) и person.filmwork_set.remove(...) не вызывают
+    # post_save/post_delete у модели связи
+    if action in ('post_add', 'post_remove'):
+        invalidate_films(pk_set if reverse else [instance.pk])
+    elif action == 'pre_clear':
+        if not reverse:
+            invalidate_films([instance.pk])
+        else:
+            field = 'person' if isinstance(instance, Person) else 'genre'
+            invalidate_films(
+                sender.objects
+                .filter(**{field: instance})
+                .values_list('film_work_id', flat=True)
+            )
@@ -0,0 +1,123 @@
+"""
+Синтетический каталог фильмов для нагрузочного тестирования.
+Документы соответствуют схеме индекса из etl/pg_to_es/schema.
+"""
+import os
+import random
+import sys
+import uuid
+from typing import Iterator, List
+
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_bulk
+
+ETL_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', 'etl'
+)
+sys.path.insert(0, ETL_DIR)
+
+from pg_to_es.schema import schema  # noqa: E402
+
+GENRES = [
+    'Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary',
+    'Drama', 'Family', 'Fantasy', 'History', 'Horror', 'Music', 'Mystery',
+    'Romance', 'Sci-Fi', 'Thriller', 'War', 'Western',
+]
+WORDS = [
+    'star', 'war', 'night', 'love', 'dark', 'city', 'last', 'king', 'story',
+    'man', 'world', 'dead', 'life', 'time', 'return', 'secret', 'lost',
+    'blood', 'space', 'ghost', 'dream', 'river', 'fire', 'empire', 'house',
+]
+
+
+def make_persons(count: int) -> List[dict]:
+    return [
+        {'id': str(uuid.uuid4()), 'name': f'Person {i}'}
+        for i in range(count)
+    ]
+
+
+def pick_persons(persons: List[dict], count: int) -> List[dict]:
+    # Популярные персоны встречаются чаще (распределение Парето)
+    result = {}
+    while len(result) < count:
+        index = int(random.paretovariate(1.2)) - 1
+        person = persons[index % len(persons)]
+        result[person['id']] = person
+    return list(result.values())
+
+
+def make_film(persons: List[dict]) -> dict:
+    actors = pick_persons(persons, random.randint(1, 30))
+    writers = pick_persons(persons, random.randint(0, 3))
+    directors = pick_persons(persons, random.randint(1, 2))
+    title = ' '.join(random.choices(WORDS, k=random.randint(1, 4))).title()
+    rating = round(random.uniform(1, 10), 1)
+    words = title.split()
+    return {
+        'id': str(uuid.uuid4()),
+        'imdb_rating': rating,
+        'genre': random.sample(GENRES, random.randint(1, 3)),
+        'title': title,
+        'title_suggest': {
+            'input': [' '.join(words[i:]) for i in range(len(words))],
+            'weight': int(rating * 10),
+        },
+        'type': random.choice(['movie', 'tv_show']),
+        'description': ' '.join(random.choices(WORDS, k=60)),
+        'director': [p['name'] for p in directors],
+        'actors': actors,
+        'actors_names': [p['name'] for p in actors],
+        'writers': writers,
+        'writers_names': [p['name'] for p in writers],
+    }
+
+
+def generate(films: int, persons: int, seed: int = 0) -> Iterator[dict]:
+    random.seed(seed)
+    people = make_persons(persons)
+    for _ in range(films):
+        yield make_film(people)
+
+
+async def recreate_index(es: AsyncElasticsearch) -> str:
+    """
+    Пересоздаёт индекс так же, как ETL (etl/main.py): movies — алиас
+    над movies_v<version>. Возвращает имя версионного индекса.
+    """
+    alias = schema.index
+    target = f'{alias}_v{schema.version}'
+    if await es.indices.exists_alias(name=alias):
+        # Удаление индексов, на которые указывает алиас, удаляет и его
+        for index in await es.indices.get_alias(name=alias):
+            await es.indices.delete(index=index, ignore=[404])
+    else:
+        await es.indices.delete(index=alias, ignore=[404])
+    await es.indices.delete(index=target, ignore=[404])
+    await es.indices.create(
+        index=target,
+        body={
+            'settings': schema.settings,
+            'mappings': schema.mappings,
+            'aliases': {alias: {}},
+        },
+    )
+    return target
+
+
+async def seed_elastic(
+        es: AsyncElasticsearch,
+        films: int,
+        persons: int) -> List[str]:
+    """Пересоздаёт индекс и заливает в него каталог. Возвращает id фильмов."""
+    index = await recreate_index(es)
+    ids = []
+
+    def actions():
+        for film in generate(films, persons):
+            ids.append(film['id'])
+            yield {'_index': index, '_id': film['id'], **film}
+
+    await async_bulk(es, actions(), chunk_size=1000)
+    await es.indices.refresh(index=index)
+    return ids
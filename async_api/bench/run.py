@@ -0,0 +1,224 @@
+"""
+Нагрузочный тест async_api.
+
+Заполняет локальные Elasticsearch и Redis синтетическим каталогом и
+нагружает /api/v1/films и /api/v1/films/{id} в нескольких режимах:
+
+    hot    — небольшой набор фильмов и запросов, почти всё из кеша
+    cold   — каждый запрос к новому фильму, кеш API предварительно очищен
+    search — поисковые запросы со случайными словами и фильтрами
+
+Пример:
+    python run.py --api http://127.0.0.1:8000 --films 20000 \\
+        --concurrency 64 --requests 5000 --output results.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+import aiohttp
+import aioredis
+import orjson
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_scan
+
+from catalog import GENRES, WORDS, seed_elastic
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summary(latencies: List[float], elapsed: float) -> dict:
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0,
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2) if latencies else 0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def hot_mix(ids: List[str]) -> Callable[[int], str]:
+    hot_ids = ids[:50]
+    queries = ['?sort=rating&page=1', '?query=star&page=1', '?page=1']
+
+    def make(i: int) -> str:
+        if i % 4 == 0:
+            return f'/api/v1/films/{random.choice(queries)}'
+        return f'/api/v1/films/{random.choice(hot_ids)}'
+    return make
+
+
+def cold_mix(ids: List[str]) -> Callable[[int], str]:
+    def make(i: int) -> str:
+        return f'/api/v1/films/{ids[i % len(ids)]}'
+    return make
+
+
+def search_mix(ids: List[str]) -> Callable[[int], str]:
+    def make(i: int) -> str:
+        query = '+'.join(random.sample(WORDS, random.randint(1, 3)))
+        params = [f'query={query}', f'page={random.randint(1, 5)}']
+        if random.random() < 0.5:
+            params.append(f'filters=genre:{random.choice(GENRES)}')
+        if random.random() < 0.3:
+            params.append('sort=rating')
+        return '/api/v1/films/?' + '&'.join(params)
+    return make
+
+
+# Ключи кеша ответов API (см. services/*_key). Остальное в той же базе —
+# рейтинги ETL (ranked:*), поток изменений с группой и популярность
+# ключей — холодный прогон не трогает
+CACHE_PATTERNS = (
+    'film:*', 'films:*', 'person:*', 'person_films:*', 'genre:*', 'genres:*',
+)
+
+
+async def clear_api_cache(redis: aioredis.Redis):
+    for pattern in CACHE_PATTERNS:
+        keys = []
+        async for key in redis.iscan(match=pattern, count=1000):
+            keys.append(key)
+            if len(keys) >= 1000:
+                await redis.unlink(*keys)
+                keys = []
+        if keys:
+            await redis.unlink(*keys)
+
+
+async def clear_ranked(redis: aioredis.Redis):
+    # Готовые рейтинги ETL описывают прежний каталог. Без них (и без
+    # признака ranked:ready) API берёт страницы с sort=rating из ES
+    keys = [key async for key in redis.iscan(match='ranked:*', count=1000)]
+    if keys:
+        await redis.unlink(*keys)
+
+
+async def film_ids(es: AsyncElasticsearch, limit: int) -> List[str]:
+    # search с size больше index.max_result_window (10000) отклоняется
+    ids = []
+    async for hit in async_scan(
+            es, index='movies', query={'_source': False}, size=1000):
+        ids.append(hit['_id'])
+        if len(ids) >= limit:
+            break
+    return ids
+
+
+MIXES = {'hot': hot_mix, 'cold': cold_mix, 'search': search_mix}
+
+
+async def run_mix(
+        session: aiohttp.ClientSession,
+        api: str,
+        make_url: Callable[[int], str],
+        requests: int,
+        concurrency: int) -> dict:
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[int, int] = defaultdict(int)
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            url = make_url(i)
+            endpoint = 'detail' if '?' not in url else 'list'
+            start = time.perf_counter()
+            async with session.get(api + url) as response:
+                await response.read()
+            latencies[endpoint].append(time.perf_counter() - start)
+            statuses[response.status] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    everything = [value for values in latencies.values() for value in values]
+    return {
+        'total': summary(everything, elapsed),
+        'endpoints': {
+            name: summary(values, elapsed) for name, values in latencies.items()
+        },
+        'statuses': dict(statuses),
+        'elapsed_s': round(elapsed, 2),
+    }
+
+
+async def main(args):
+    es = AsyncElasticsearch(
+        hosts=[args.elastic],
+        http_auth=(args.elastic_user, args.elastic_password),
+    )
+    redis = await aioredis.create_redis_pool(args.redis)
+    try:
+        if args.seed:
+            ids = await seed_elastic(es, args.films, args.persons)
+            await clear_ranked(redis)
+            await clear_api_cache(redis)
+        else:
+            ids = await film_ids(es, args.films)
+        results = {
+            'params': {
+                'films': len(ids),
+                'requests': args.requests,
+                'concurrency': args.concurrency,
+            },
+            'mixes': {},
+        }
+        async with aiohttp.ClientSession() as session:
+            for mix in args.mixes:
+                if mix == 'cold':
+                    await clear_api_cache(redis)
+                results['mixes'][mix] = await run_mix(
+                    session, args.api, MIXES[mix](ids),
+                    args.requests, args.concurrency
+                )
+                print(mix, orjson.dumps(results['mixes'][mix]['total']).decode())
+    finally:
+        redis.close()
+        await redis.wait_closed()
+        await es.close()
+
+    if args.output:
+        with open(args.output, 'wb') as file:
+            file.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--api', default='http://127.0.0.1:8000')
+    parser.add_argument('--elastic', default='http://127.0.0.1:9200')
+    parser.add_argument(
+        '--elastic-user', default=os.getenv('ELASTIC_USER', 'elastic')
+    )
+    parser.add_argument(
+        '--elastic-password', default=os.getenv('ELASTIC_PASSWORD', '')
+    )
+    parser.add_argument('--redis', default='redis://127.0.0.1:6379')
+    parser.add_argument('--films', type=int, default=10000)
+    parser.add_argument('--persons', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument(
+        '--mixes', nargs='+', choices=list(MIXES), default=list(MIXES)
+    )
+    parser.add_argument(
+        '--no-seed', dest='seed', action='store_false',
+        help='не пересоздавать индекс, взять фильмы из существующего'
+    )
+    parser.add_argument('--output', help='куда сохранить результаты (json)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
@@ -1,30 +1,83 @@
 from http import HTTPStatus
-from fastapi import APIRouter, Depends, HTTPException
-from typing import Dict
-from services.film import FilmService, get_film_service
-from models.schema_film import FullFilm, QueryFilms, ShortFilm
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
+from typing import Dict, List, Optional
+from api.v1.responses import JSON_MEDIA_TYPE, cached_response
+from core import config
+from services.film import (
+    FILM_CACHE_STALE_IN_SECONDS, FILMS_CACHE_STALE_IN_SECONDS,
+    FilmService, export_fields, get_film_service
+)
+from services.suggest import SuggestService, get_suggest_service
+from models.schema_film import FilmFilters, FullFilm, QueryFilms, SuggestFilm
 
 
 router = APIRouter()
 
+# Тело ответа хранится в кеше уже сериализованным и валидированным,
+# поэтому отдаём байты как есть, минуя response_model и ORJSONResponse
+FILM_MAX_AGE = min(config.HTTP_CACHE_MAX_AGE, FILM_CACHE_STALE_IN_SECONDS)
+FILMS_MAX_AGE = min(config.HTTP_CACHE_MAX_AGE, FILMS_CACHE_STALE_IN_SECONDS)
+SUGGEST_MAX_AGE = min(config.HTTP_CACHE_MAX_AGE, int(config.SUGGEST_CACHE_TTL))
+
+
+@router.get('/suggest', response_model=List[SuggestFilm])
+async def suggest_films(
+        prefix: str = Query(..., min_length=1, max_length=100),
+        size: int = Query(10, ge=1, le=20),
+        suggest_service: SuggestService = Depends(get_suggest_service)
+) -> Response:
+    """Подсказки по началу названия фильма: только id и название."""
+    data = await suggest_service.get_suggestions_raw(prefix, size)
+    return Response(
+        content=data,
+        media_type=JSON_MEDIA_TYPE,
+        headers={'Cache-Control': f'public, max-age={SUGGEST_MAX_AGE}'}
+    )
+
+
+@router.get('/export')
+async def export_films(
+        film_service: FilmService = Depends(get_film_service),
+        filters: Optional[str] = None,
+        fields: Optional[str] = None
+) -> StreamingResponse:
+    """
+    Потоковая выгрузка всего каталога в формате NDJSON (один фильм на строку).
+    fields — поля через запятую, filters — как в списке фильмов.
+    """
+    try:
+        parsed_filters = FilmFilters.parse(filters)
+        parsed_fields = export_fields(fields)
+    except ValueError as err:
+        raise HTTPException(status_code=HTTPStatus.UNPROCESSABLE_ENTITY, detail=str(err))
+    # PIT открывается до ответа, чтобы ошибки ES вернулись кодом 503/400,
+    # а в поток уходит только обход страниц
+    pages = await film_service.export_films(parsed_filters, parsed_fields)
+    return StreamingResponse(pages, media_type='application/x-ndjson')
+
+
 @router.get('/{film_id}', response_model=FullFilm)
-async def film_details(film_id: str, film_service: FilmService = Depends(get_film_service)) -> FullFilm:
-    film = await film_service.get_by_id(film_id)
-    if not film:
+async def film_details(
+        film_id: str,
+        film_service: FilmService = Depends(get_film_service),
+        if_none_match: Optional[str] = Header(None)
+) -> Response:
+    entry = await film_service.get_by_id_raw(film_id)
+    if not entry:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='film not found')
-    return FullFilm(**film.dict())
+    return cached_response(entry, if_none_match, FILM_MAX_AGE)
 
 
 @router.get('/', response_model=Dict)
 async def films(
         film_service: FilmService = Depends(get_film_service),
-        query_films: QueryFilms = Depends()
+        query_films: QueryFilms = Depends(),
+        if_none_match: Optional[str] = Header(None)
 ):
 
-    total, curent_page, films = await film_service.get_many_films(query_films)
-
-    return {
-        'total': total,
-        'page': curent_page,
-        'result': [ShortFilm(**film) for film in films],
-    }
+    try:
+        entry = await film_service.get_many_films_raw(query_films)
+    except ValueError as err:
+        raise HTTPException(status_code=HTTPStatus.UNPROCESSABLE_ENTITY, detail=str(err))
+    return cached_response(entry, if_none_match, FILMS_MAX_AGE)
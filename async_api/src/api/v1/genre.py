@@ -0,0 +1,36 @@
+from http import HTTPStatus
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import Response
+from typing import List, Optional
+from api.v1.responses import cached_response
+from core import config
+from models.schema_genre import Genre
+from services.genre import (
+    GENRE_CACHE_STALE_IN_SECONDS, GenreService, get_genre_service
+)
+
+
+router = APIRouter()
+
+GENRE_MAX_AGE = min(config.HTTP_CACHE_MAX_AGE, GENRE_CACHE_STALE_IN_SECONDS)
+
+
+@router.get('/{genre_id}', response_model=Genre)
+async def genre_details(
+        genre_id: str,
+        genre_service: GenreService = Depends(get_genre_service),
+        if_none_match: Optional[str] = Header(None)
+) -> Response:
+    entry = await genre_service.get_by_id_raw(genre_id)
+    if not entry:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='genre not found')
+    return cached_response(entry, if_none_match, GENRE_MAX_AGE)
+
+
+@router.get('/', response_model=List[Genre])
+async def genres(
+        genre_service: GenreService = Depends(get_genre_service),
+        if_none_match: Optional[str] = Header(None)
+) -> Response:
+    entry = await genre_service.get_all_raw()
+    return cached_response(entry, if_none_match, GENRE_MAX_AGE)
@@ -0,0 +1,45 @@
+from http import HTTPStatus
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import Response
+from typing import List, Optional
+from api.v1.responses import cached_response
+from core import config
+from models.schema_film import ShortFilm
+from models.schema_person import PersonDetails
+from services.person import (
+    PERSON_CACHE_STALE_IN_SECONDS, PersonService, get_person_service
+)
+
+
+router = APIRouter()
+
+PERSON_MAX_AGE = min(config.HTTP_CACHE_MAX_AGE, PERSON_CACHE_STALE_IN_SECONDS)
+
+
+@router.get('/{person_id}/films', response_model=List[ShortFilm])
+async def person_films(
+        person_id: str,
+        page: int = Query(1, ge=1),
+        person_service: PersonService = Depends(get_person_service),
+        if_none_match: Optional[str] = Header(None)
+) -> Response:
+    """
+    Фильмы персоны, отсортированные по рейтингу, страницами
+    по PERSON_FILMS_PAGE_SIZE; за последней страницей — пустой список.
+    """
+    entry = await person_service.get_films_raw(person_id, page)
+    if not entry:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='person not found')
+    return cached_response(entry, if_none_match, PERSON_MAX_AGE)
+
+
+@router.get('/{person_id}', response_model=PersonDetails)
+async def person_details(
+        person_id: str,
+        person_service: PersonService = Depends(get_person_service),
+        if_none_match: Optional[str] = Header(None)
+) -> Response:
+    entry = await person_service.get_by_id_raw(person_id)
+    if not entry:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='person not found')
+    return cached_response(entry, if_none_match, PERSON_MAX_AGE)
@@ -0,0 +1,55 @@
+from http import HTTPStatus
+from typing import Optional
+
+from fastapi.responses import Response
+
+from core.metrics import timed
+from services.cache import CacheEntry
+
+JSON_MEDIA_TYPE = 'application/json'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # https://httpwg.org/specs/rfc7232.html#header.if-none-match
+    # Для If-None-Match используется слабое сравнение, поэтому W/ отбрасываем
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def cached_response(
+        entry: CacheEntry,
+        if_none_match: Optional[str],
+        max_age: int) -> Response:
+    """
+    Отдаёт закешированное тело ответа как есть.
+    Если у клиента уже есть актуальная версия, отвечаем 304 без тела.
+    """
+    with timed('render'):
+        return _cached_response(entry, if_none_match, max_age)
+
+
+def _cached_response(
+        entry: CacheEntry,
+        if_none_match: Optional[str],
+        max_age: int) -> Response:
+    headers = {
+        'ETag': entry.etag,
+        'Cache-Control': f'public, max-age={max_age}',
+    }
+    if entry.is_stale:
+        # Запись устарела и обновляется в фоне (или ES недоступен)
+        headers['X-Cache-Status'] = 'STALE'
+    if etag_matches(if_none_match, entry.etag):
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+    return Response(
+        content=entry.body, media_type=JSON_MEDIA_TYPE, headers=headers
+    )
@@ -18,7 +18,102 @@ ELASTIC_HOST = os.getenv('ELASTIC_HOST', '127.0.0.1')
 ELASTIC_PORT = int(os.getenv('ELASTIC_PORT', 9200))
 ELASTIC_PASSWORD = os.getenv('ELASTIC_PASSWORD', '22061941')
 ELASTIC_USER = os.getenv('ELASTIC_USER', 'elastic')
+ELASTIC_TIMEOUT = float(os.getenv('ELASTIC_TIMEOUT', 5))
 
+# Admission control для запросов к Elasticsearch.
+# LOOKUP — запросы фильма по id, SEARCH — поиск и списки
+ELASTIC_LOOKUP_CONCURRENCY = int(os.getenv('ELASTIC_LOOKUP_CONCURRENCY', 50))
+ELASTIC_LOOKUP_QUEUE = int(os.getenv('ELASTIC_LOOKUP_QUEUE', 200))
+ELASTIC_SEARCH_CONCURRENCY = int(os.getenv('ELASTIC_SEARCH_CONCURRENCY', 10))
+ELASTIC_SEARCH_QUEUE = int(os.getenv('ELASTIC_SEARCH_QUEUE', 50))
+# Сколько запрос может ждать своей очереди, прежде чем получить 503
+ELASTIC_QUEUE_TIMEOUT = float(os.getenv('ELASTIC_QUEUE_TIMEOUT', 1))
+ELASTIC_BREAKER_FAILURES = int(os.getenv('ELASTIC_BREAKER_FAILURES', 5))
+ELASTIC_BREAKER_RESET = float(os.getenv('ELASTIC_BREAKER_RESET', 10))
+
+# Настройки кеша
+# Кеш инвалидируется по событиям ETL, поэтому TTL может быть большим.
+# EXPIRE (hard TTL) — через сколько запись удаляется из Redis,
+# STALE (soft TTL) — через сколько запись отдаётся как устаревшая
+# и обновляется в фоне
+FILM_CACHE_EXPIRE_IN_SECONDS = int(
+    os.getenv('FILM_CACHE_EXPIRE_IN_SECONDS', 60 * 60 * 24)
+)
+FILM_CACHE_STALE_IN_SECONDS = int(
+    os.getenv('FILM_CACHE_STALE_IN_SECONDS', 60 * 10)
+)
+FILMS_CACHE_EXPIRE_IN_SECONDS = int(
+    os.getenv('FILMS_CACHE_EXPIRE_IN_SECONDS', 60 * 60)
+)
+FILMS_CACHE_STALE_IN_SECONDS = int(
+    os.getenv('FILMS_CACHE_STALE_IN_SECONDS', 60 * 5)
+)
+
+# Персоны и жанры меняются редко и тоже инвалидируются по событиям ETL
+PERSON_CACHE_EXPIRE_IN_SECONDS = int(
+    os.getenv('PERSON_CACHE_EXPIRE_IN_SECONDS', 60 * 60 * 24)
+)
+PERSON_CACHE_STALE_IN_SECONDS = int(
+    os.getenv('PERSON_CACHE_STALE_IN_SECONDS', 60 * 10)
+)
+GENRE_CACHE_EXPIRE_IN_SECONDS = int(
+    os.getenv('GENRE_CACHE_EXPIRE_IN_SECONDS', 60 * 60 * 24)
+)
+GENRE_CACHE_STALE_IN_SECONDS = int(
+    os.getenv('GENRE_CACHE_STALE_IN_SECONDS', 60 * 10)
+)
+
+# Сколько клиенты и CDN могут не перепроверять ответ (Cache-Control max-age).
+# Не больше soft TTL кеша; после истечения клиент перепроверяет ответ по ETag
+HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', 60))
+
+# Хранилище кеша ответов: redis, memory (в памяти процесса) или none.
+# memory не разделяется между воркерами и подходит для тестов
+# и запуска в один процесс
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis')
+# Значения больше этого размера (байт) сжимаются, 0 — не сжимать
+CACHE_COMPRESS_MIN_SIZE = int(os.getenv('CACHE_COMPRESS_MIN_SIZE', 1024))
+CACHE_COMPRESS_LEVEL = int(os.getenv('CACHE_COMPRESS_LEVEL', 1))
+CACHE_MEMORY_MAX_ITEMS = int(os.getenv('CACHE_MEMORY_MAX_ITEMS', 10000))
+# Сколько ключей каждого семейства измерять при оценке занимаемой памяти
+CACHE_MEMORY_SAMPLE = int(os.getenv('CACHE_MEMORY_SAMPLE', 100))
+# Сколько ключей Redis обходить при оценке, остальное экстраполируется
+CACHE_MEMORY_SCAN_LIMIT = int(os.getenv('CACHE_MEMORY_SCAN_LIMIT', 10000))
+# Токен служебного эндпоинта /cache/memory (заголовок X-Admin-Token).
+# Эндпоинт обходит все ключи Redis, поэтому без токена он выключен
+CACHE_MEMORY_TOKEN = os.getenv('CACHE_MEMORY_TOKEN', '')
+
+# Учёт популярности ключей кеша: доля учитываемых запросов,
+# сколько ключей хранить и во сколько раз максимум увеличивать TTL
+POPULARITY_SAMPLE_RATE = float(os.getenv('POPULARITY_SAMPLE_RATE', 0.1))
+POPULARITY_KEEP = int(os.getenv('POPULARITY_KEEP', 10000))
+POPULARITY_MAX_TTL_FACTOR = float(os.getenv('POPULARITY_MAX_TTL_FACTOR', 8))
+
+# Прогрев кеша при старте воркера
+WARMUP_FILMS = int(os.getenv('WARMUP_FILMS', 100))
+WARMUP_SEARCHES = int(os.getenv('WARMUP_SEARCHES', 50))
+WARMUP_TIMEOUT = float(os.getenv('WARMUP_TIMEOUT', 30))
+
+# Подсказки по названию: размер и TTL кеша префиксов в памяти воркера
+SUGGEST_CACHE_SIZE = int(os.getenv('SUGGEST_CACHE_SIZE', 10000))
+SUGGEST_CACHE_TTL = float(os.getenv('SUGGEST_CACHE_TTL', 60))
+
+# Поток Redis, в который ETL публикует id изменённых фильмов
+CHANGES_STREAM = os.getenv('CHANGES_STREAM', 'movies:changed')
+CHANGES_GROUP = os.getenv('CHANGES_GROUP', 'async_api')
+# Сюда переносятся события, обработка которых раз за разом падает
+CHANGES_DEAD_STREAM = os.getenv('CHANGES_DEAD_STREAM', 'movies:changed:dead')
+
+# Готовые рейтинги фильмов, которые поддерживает ETL (см. etl/settings.py)
+RANKED_ALL = 'ranked:rating'
+RANKED_GENRE_PREFIX = 'ranked:rating:genre:'
+RANKED_FILMS = 'ranked:films'
+RANKED_READY = 'ranked:ready'
+
+# До скольки документов ES точно считает total в списках с сортировкой
+# по рейтингу. Индекс movies отсортирован по рейтингу (index.sort), и
+# такой запрос останавливается, как только набрал страницу и этот счёт
+FILMS_TRACK_TOTAL_HITS = int(os.getenv('FILMS_TRACK_TOTAL_HITS', 1000))
 
 # Корень проекта
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
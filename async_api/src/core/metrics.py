@@ -0,0 +1,207 @@
+"""
+Минимальная реализация метрик в формате Prometheus и заголовка Server-Timing.
+
+Метрики хранятся в памяти воркера, поэтому накладные расходы на запрос —
+несколько вызовов perf_counter и поиск корзины гистограммы.
+"""
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+# Границы корзин гистограмм, секунды
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Длительности этапов текущего запроса, мс: этап -> сумма.
+# Заполняется хуками в сервисах, читается middleware для Server-Timing
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    'request_timings', default=None
+)
+
+
+def format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not labelnames:
+        return ''
+    pairs = ','.join(f'{k}="{v}"' for k, v in zip(labelnames, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = defaultdict(float)
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        self._values[tuple(labels[k] for k in self.labelnames)] += amount
+
+    def render(self) -> List[str]:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} counter',
+        ]
+        for values, value in self._values.items():
+            lines.append(
+                f'{self.name}{format_labels(self.labelnames, values)} {value}'
+            )
+        return lines
+
+
+class Histogram:
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Tuple[str, ...] = (),
+            buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [счётчики по корзинам (+Inf последняя), сумма]
+        self._values: Dict[tuple, list] = {}
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[k] for k in self.labelnames)
+        data = self._values.get(key)
+        if data is None:
+            data = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        data[0][bisect_left(self.buckets, value)] += 1
+        data[1] += value
+
+    def render(self) -> List[str]:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} histogram',
+        ]
+        for values, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                labels = format_labels(
+                    self.labelnames + ('le',), values + (str(bound),)
+                )
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = format_labels(self.labelnames, values)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+REGISTRY: List = []
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds',
+    'Время обработки HTTP-запроса',
+    ('endpoint', 'status'),
+)
+STAGE_SECONDS = Histogram(
+    'api_stage_duration_seconds',
+    'Время этапов обработки запроса (кеш, ES, модели, ответ)',
+    ('stage',),
+)
+ES_TOOK_SECONDS = Histogram(
+    'elastic_took_seconds',
+    'Время выполнения запроса внутри Elasticsearch (поле took)',
+)
+CACHE_REQUESTS = Counter(
+    'api_cache_requests_total',
+    'Обращения к кешу по результату (hit, stale, miss)',
+    ('kind', 'result'),
+)
+
+
+def record(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds * 1000
+
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def observe_es_took(took_ms: float):
+    ES_TOOK_SECONDS.observe(took_ms / 1000)
+    timings = request_timings.get()
+    if timings is not None:
+        timings['es_took'] = timings.get('es_took', 0.0) + took_ms
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    # https://www.w3.org/TR/server-timing/
+    return ', '.join(
+        f'{stage};dur={duration:.2f}' for stage, duration in timings.items()
+    )
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware: длительности этапов запроса для Server-Timing
+    и гистограммы http_request_duration_seconds.
+
+    Написан без BaseHTTPMiddleware: тот передаёт тело ответа через
+    неограниченную очередь, и потоковый ответ (выгрузка каталога) для
+    медленного клиента целиком копился бы в памяти. Здесь сообщения
+    ответа уходят серверу напрямую, с его backpressure.
+    Server-Timing total — время до начала ответа, гистограмма — время
+    до отправки последнего байта.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        timings = {}
+        status = {'code': 500}
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+                timings['total'] = (time.perf_counter() - start) * 1000
+                message['headers'] = list(message.get('headers', [])) + [
+                    (b'server-timing', server_timing(timings).encode())
+                ]
+            await send(message)
+
+        token = request_timings.set(timings)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_timings.reset(token)
+            # Роутер дописывает endpoint в тот же scope
+            endpoint = scope.get('endpoint')
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                endpoint=getattr(endpoint, '__name__', 'unknown'),
+                status=str(status['code']),
+            )
+
+
+def render_metrics() -> bytes:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return ('\n'.join(lines) + '\n').encode()
@@ -0,0 +1,25 @@
+from typing import Optional
+from aioredis import Redis
+
+from core import config
+from services.cache_backends import (
+    CacheBackend, MemoryCacheBackend, NullCacheBackend, RedisCacheBackend
+)
+
+cache: Optional[CacheBackend] = None
+
+
+def create_cache(redis: Redis) -> CacheBackend:
+    # Хранилище выбирается настройкой CACHE_BACKEND
+    if config.CACHE_BACKEND == 'redis':
+        return RedisCacheBackend(redis)
+    if config.CACHE_BACKEND == 'memory':
+        return MemoryCacheBackend()
+    if config.CACHE_BACKEND == 'none':
+        return NullCacheBackend()
+    raise ValueError(f'Unknown CACHE_BACKEND: {config.CACHE_BACKEND}')
+
+
+# Функция понадобится при внедрении зависимостей
+async def get_cache() -> CacheBackend:
+    return cache
@@ -1,9 +1,39 @@
 from typing import Optional
 from elasticsearch import AsyncElasticsearch
 
+from core import config
+from services.limiter import CircuitBreaker, ConcurrencyLimiter, ElasticGuard
+
 es: Optional[AsyncElasticsearch] = None
+guard: Optional[ElasticGuard] = None
+
+
+def create_guard() -> ElasticGuard:
+    # Создаётся при старте сервера, когда уже запущен event-loop
+    return ElasticGuard(
+        lookup=ConcurrencyLimiter(
+            'elastic lookup',
+            config.ELASTIC_LOOKUP_CONCURRENCY,
+            config.ELASTIC_LOOKUP_QUEUE,
+            config.ELASTIC_QUEUE_TIMEOUT,
+        ),
+        search=ConcurrencyLimiter(
+            'elastic search',
+            config.ELASTIC_SEARCH_CONCURRENCY,
+            config.ELASTIC_SEARCH_QUEUE,
+            config.ELASTIC_QUEUE_TIMEOUT,
+        ),
+        breaker=CircuitBreaker(
+            config.ELASTIC_BREAKER_FAILURES,
+            config.ELASTIC_BREAKER_RESET,
+        ),
+    )
 
 
 # Функция понадобится при внедрении зависимостей
 async def get_elastic() -> AsyncElasticsearch:
-    return es
\ No newline at end of file
+    return es
+
+
+async def get_elastic_guard() -> ElasticGuard:
+    return guard
@@ -1,14 +1,23 @@
+import asyncio
 import logging
+import os
+import secrets
 import aioredis
 import uvicorn as uvicorn
 from elasticsearch import AsyncElasticsearch
-from fastapi import FastAPI
-from fastapi.responses import ORJSONResponse
-from api.v1 import film
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import ORJSONResponse, Response
+from api.v1 import film, genre, person
 from core import config
+from core import metrics
 from core.logger import LOGGING
+from db import cache
 from db import elastic
 from db import redis
+from services.changes import listen_changes
+from services.errors import ServiceUnavailableError, StorageRequestError
+from services.film import FilmService
+from services.warmup import warm_up
 
 app = FastAPI(
     title=config.PROJECT_NAME,
@@ -18,6 +27,47 @@ app = FastAPI(
 )
 
 
+app.add_middleware(metrics.TimingMiddleware)
+
+
+@app.get('/metrics', include_in_schema=False)
+async def metrics_endpoint():
+    return Response(
+        content=metrics.render_metrics(), media_type=metrics.CONTENT_TYPE
+    )
+
+
+@app.get('/cache/memory', include_in_schema=False)
+async def cache_memory_endpoint(x_admin_token: str = Header('')):
+    # Память, занятая кешем, по семействам ключей (film, films, ...).
+    # Служебный и дорогой запрос: доступен только с токеном администратора
+    if not config.CACHE_MEMORY_TOKEN:
+        raise HTTPException(status_code=404)
+    if not secrets.compare_digest(
+            x_admin_token.encode(), config.CACHE_MEMORY_TOKEN.encode()
+    ):
+        raise HTTPException(status_code=403)
+    return await cache.cache.memory_usage()
+
+
+@app.exception_handler(ServiceUnavailableError)
+async def service_unavailable_handler(request: Request, exc: ServiceUnavailableError):
+    return ORJSONResponse(
+        status_code=503,
+        content={'detail': exc.detail},
+        headers={'Retry-After': str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(StorageRequestError)
+async def storage_request_handler(request: Request, exc: StorageRequestError):
+    # Некорректный запрос к ES не означает, что кластер недоступен
+    return ORJSONResponse(
+        status_code=400 if exc.status_code == 400 else 500,
+        content={'detail': exc.detail},
+    )
+
+
 @app.on_event('startup')
 async def startup():
     # Подключаемся к базам при старте сервера
@@ -29,18 +79,44 @@ async def startup():
         minsize=10,
         maxsize=20
     )
+    cache.cache = cache.create_cache(redis.redis)
     elastic.es = AsyncElasticsearch(
         hosts=[f'{config.ELASTIC_HOST}:{config.ELASTIC_PORT}'],
-        http_auth=(config.ELASTIC_USER, config.ELASTIC_PASSWORD)
+        http_auth=(config.ELASTIC_USER, config.ELASTIC_PASSWORD),
+        timeout=config.ELASTIC_TIMEOUT,
+    )
+    elastic.guard = elastic.create_guard()
+
+    # Прогреваем кеш популярными фильмами и запросами до того,
+    # как воркер начнёт принимать запросы
+    try:
+        await asyncio.wait_for(
+            warm_up(FilmService(
+                cache.cache, elastic.es, elastic.guard, redis.redis
+            )),
+            timeout=config.WARMUP_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        logging.getLogger(__name__).warning('Прогрев кеша прерван по таймауту')
+
+    # Слушаем события ETL об изменённых фильмах и инвалидируем кеш
+    app.state.changes_listener = asyncio.create_task(
+        listen_changes(
+            redis.redis, cache.cache, elastic.es, elastic.guard,
+            consumer=f'api-{os.getpid()}'
+        )
     )
 
 @app.on_event('shutdown')
 async def shutdown():
+    app.state.changes_listener.cancel()
     await redis.redis.close()
     await elastic.es.close()
 
 
 app.include_router(film.router, prefix='/api/v1/films', tags=['film'])
+app.include_router(person.router, prefix='/api/v1/persons', tags=['person'])
+app.include_router(genre.router, prefix='/api/v1/genres', tags=['genre'])
 
 if __name__ == '__main__':
     uvicorn.run(
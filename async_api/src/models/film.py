@@ -16,6 +16,7 @@ class Film(BaseModel):
     imdb_rating: Optional[float] = 0
     genre: Optional[List[str]] = []
     title: str
+    type: Optional[str] = None
     description: Optional[str] = None
     director: List[str] = []
     actors: List[Person]
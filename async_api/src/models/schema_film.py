@@ -1,6 +1,13 @@
 from pydantic import BaseModel
 from typing import Optional, List
 
+# Разделители в параметре filters:
+# filters=genre:Action|Drama;rating:7..9;type:movie;person:<uuid>
+FILTERS_SEPARATOR = ';'
+FILTER_KEY_SEPARATOR = ':'
+FILTER_VALUES_SEPARATOR = '|'
+RANGE_SEPARATOR = '..'
+
 
 class Person(BaseModel):
     id: str
@@ -11,6 +18,7 @@ class FullFilm(BaseModel):
     imdb_rating: Optional[float] = 0
     genre: Optional[List[str]] = []
     title: str
+    type: Optional[str] = None
     description: Optional[str] = None
     director: List[str] = []
     actors_names: List = []
@@ -23,8 +31,56 @@ class ShortFilm(BaseModel):
     title: str
 
 
+class SuggestFilm(BaseModel):
+    id: str
+    title: str
+
+
 class QueryFilms(BaseModel):
     sort: Optional[str]
     page: Optional[int]
     filters: Optional[str]
-    query: Optional[str]
\ No newline at end of file
+    query: Optional[str]
+
+
+class FilmFilters(BaseModel):
+    genre: List[str] = []
+    type: List[str] = []
+    person: List[str] = []
+    rating_gte: Optional[float] = None
+    rating_lte: Optional[float] = None
+
+    @classmethod
+    def parse(cls, raw: Optional[str]) -> 'FilmFilters':
+        """
+        Разбирает строку фильтров в нормализованный набор:
+        значения отсортированы и без повторов, чтобы одинаковые
+        фильтры, заданные в разном порядке, давали один ключ кеша.
+        """
+        values = {'genre': set(), 'type': set(), 'person': set()}
+        rating = {}
+        for item in (raw or '').split(FILTERS_SEPARATOR):
+            if not item.strip():
+                continue
+            key, _, value = item.partition(FILTER_KEY_SEPARATOR)
+            key = key.strip()
+            if key == 'rating':
+                low, _, high = value.partition(RANGE_SEPARATOR)
+                try:
+                    if low.strip():
+                        rating['rating_gte'] = float(low)
+                    if high.strip():
+                        rating['rating_lte'] = float(high)
+                except ValueError:
+                    raise ValueError(f'bad rating range: {value}')
+            elif key in values:
+                values[key].update(
+                    v.strip() for v in value.split(FILTER_VALUES_SEPARATOR)
+                    if v.strip()
+                )
+            else:
+                raise ValueError(f'unknown filter: {key}')
+        return cls(
+            **{key: sorted(items) for key, items in values.items()},
+            **rating
+        )
@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+from typing import Optional
+
+
+class Genre(BaseModel):
+    id: str
+    name: str
+    description: Optional[str] = None
+    films_count: int = 0
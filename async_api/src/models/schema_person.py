@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import List
+
+
+class PersonFilm(BaseModel):
+    id: str
+    roles: List[str] = []
+
+
+class PersonDetails(BaseModel):
+    id: str
+    full_name: str
+    roles: List[str] = []
+    films: List[PersonFilm] = []
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import orjson
+from aioredis import Redis
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.exceptions import NotFoundError, TransportError
+
+from core.metrics import CACHE_REQUESTS, timed
+from services.cache import CacheEntry, make_entry, pack, unpack
+from services.cache_backends import CacheBackend
+from services.errors import ServiceUnavailableError, StorageRequestError
+from services.limiter import ElasticGuard, is_cluster_failure
+from services.popularity import PopularityTracker
+
+logger = logging.getLogger(__name__)
+
+# Ошибки запросов к ES. Circuit breaker считает из них только отказы
+# кластера (is_cluster_failure). NotFoundError — обычный ответ «документа нет»
+ES_FAILURES = (TransportError,)
+ES_IGNORED = (NotFoundError,)
+
+# Сколько держится блокировка фонового обновления записи
+REFRESH_LOCK_IN_SECONDS = 30
+
+
+def storage_error(err: TransportError) -> Exception:
+    # Ошибка, которой сервис отвечает на ошибку ES: 503 при отказе
+    # кластера, иначе ошибка в самом запросе
+    if is_cluster_failure(err):
+        return ServiceUnavailableError('elasticsearch unavailable')
+    return StorageRequestError(err.status_code)
+
+
+def source_fields(model) -> List[str]:
+    # Поля _source, которые нужно получить из ES для модели ответа.
+    # Всё остальное ES не загружает в fetch phase и не передаёт по сети
+    return list(model.__fields__)
+
+
+def render(data) -> bytes:
+    # В кеше храним уже готовое тело ответа, чтобы при попадании в кеш
+    # отдавать байты как есть, без разбора и повторной сериализации
+    return orjson.dumps(data)
+
+
+class CachedService:
+    """
+    Общая часть сервисов API: кеш готовых ответов со stale-while-revalidate
+    и защищённые ElasticGuard запросы к Elasticsearch.
+    """
+
+    def __init__(
+            self,
+            cache: CacheBackend,
+            elastic: AsyncElasticsearch,
+            guard: ElasticGuard,
+            redis: Optional[Redis] = None):
+        self.cache = cache
+        self.elastic = elastic
+        self.guard = guard
+        # Redis нужен только для учёта популярности и готовых рейтингов;
+        # без него сервис работает на одном кеше и ES
+        self.redis = redis
+        self.popularity = PopularityTracker(redis)
+        # Фоновые обновления устаревших записей: ключ -> задача
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    async def _get_source(
+            self, index: str, doc_id: str, fields: List[str]) -> Optional[dict]:
+        try:
+            async with self.guard.call(
+                    self.guard.lookup, ES_FAILURES, ES_IGNORED
+            ):
+                with timed('es'):
+                    doc = await self.elastic.get(
+                        index, doc_id, _source_includes=fields
+                    )
+        except NotFoundError:
+            return None
+        except TransportError as err:
+            # Недоступность ES — не повод отвечать 404
+            raise storage_error(err) from err
+        return doc['_source']
+
+    async def _get_or_load(
+            self,
+            key: str,
+            load: Callable[[], Awaitable[Optional[bytes]]],
+            soft_ttl: int,
+            hard_ttl: int,
+            track: Optional[Tuple[str, str]] = None,
+            count: bool = True) -> Optional[CacheEntry]:
+        """
+        Stale-while-revalidate: свежую запись отдаём из кеша, устаревшую
+        отдаём сразу же и обновляем в фоне, при отсутствии записи
+        загружаем данные синхронно.
+        track — (вид, ключ) для учёта популярности; TTL популярных
+        записей увеличивается. count=False — обращение не засчитывается
+        в популярность (прогрев кеша не клиентский запрос).
+        """
+        if track and count:
+            await self.popularity.hit(*track)
+        # Пытаемся получить данные из кеша, потому что оно работает быстрее
+        with timed('cache_get'):
+            entry = unpack(await self.cache.get(key))
+        kind = key.split(':', 1)[0]
+        if entry is None:
+            CACHE_REQUESTS.inc(kind=kind, result='miss')
+        elif entry.is_stale:
+            CACHE_REQUESTS.inc(kind=kind, result='stale')
+        else:
+            CACHE_REQUESTS.inc(kind=kind, result='hit')
+        if entry is None or entry.is_stale:
+            if track:
+                factor = await self.popularity.ttl_factor(*track)
+                soft_ttl = int(soft_ttl * factor)
+                hard_ttl = int(hard_ttl * factor)
+        if entry is None:
+            return await self._load_to_cache(key, load, soft_ttl, hard_ttl)
+        if entry.is_stale:
+            self._refresh_in_background(key, load, soft_ttl, hard_ttl)
+        return entry
+
+    async def _load_to_cache(
+            self,
+            key: str,
+            load: Callable[[], Awaitable[Optional[bytes]]],
+            soft_ttl: int,
+            hard_ttl: int) -> Optional[CacheEntry]:
+        body = await load()
+        if body is None:
+            await self.cache.delete(key)
+            return None
+        entry = make_entry(body, soft_ttl)
+        with timed('cache_set'):
+            await self.cache.set(key, pack(entry), hard_ttl)
+        return entry
+
+    def _refresh_in_background(self, key, load, soft_ttl, hard_ttl):
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(
+            self._refresh(key, load, soft_ttl, hard_ttl)
+        )
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _refresh(self, key, load, soft_ttl, hard_ttl):
+        # Блокировка в кеше не даёт всем воркерам одновременно
+        # обновлять одну и ту же запись
+        locked = await self.cache.add(
+            f'{key}:refresh', 1, REFRESH_LOCK_IN_SECONDS
+        )
+        if not locked:
+            return
+        try:
+            await self._load_to_cache(key, load, soft_ttl, hard_ttl)
+        except ServiceUnavailableError as err:
+            # Пока ES недоступен, продолжаем отдавать устаревшую запись
+            logger.warning(f'Не удалось обновить {key}: {err}')
+            await self.cache.expire(key, hard_ttl)
+        except Exception:
+            logger.exception(f'Не удалось обновить {key}')
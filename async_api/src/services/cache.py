@@ -0,0 +1,49 @@
+import hashlib
+import time
+from typing import NamedTuple, Optional
+
+import orjson
+
+# Запись кеша: заголовок (json) и готовое тело ответа, разделённые переводом
+# строки. orjson никогда не пишет перевод строки внутрь json, поэтому
+# заголовок однозначно отделяется от тела одним вызовом split
+SEPARATOR = b'\n'
+
+
+class CacheEntry(NamedTuple):
+    body: bytes
+    etag: str
+    # Момент (unix time), после которого запись считается устаревшей
+    # (soft TTL). Устаревшую запись ещё можно отдать, но её пора обновить.
+    # Из Redis запись удаляется позже, по hard TTL
+    stale_at: float
+
+    @property
+    def is_stale(self) -> bool:
+        return time.time() >= self.stale_at
+
+
+def make_etag(body: bytes) -> str:
+    # Сильный ETag по содержимому ответа
+    return '"{}"'.format(hashlib.md5(body).hexdigest())
+
+
+def make_entry(body: bytes, soft_ttl: int) -> CacheEntry:
+    return CacheEntry(
+        body=body, etag=make_etag(body), stale_at=time.time() + soft_ttl
+    )
+
+
+def pack(entry: CacheEntry) -> bytes:
+    header = orjson.dumps({'etag': entry.etag, 'stale_at': entry.stale_at})
+    return header + SEPARATOR + entry.body
+
+
+def unpack(data: Optional[bytes]) -> Optional[CacheEntry]:
+    if not data:
+        return None
+    header, body = data.split(SEPARATOR, 1)
+    header = orjson.loads(header)
+    return CacheEntry(
+        body=body, etag=header['etag'], stale_at=header['stale_at']
+    )
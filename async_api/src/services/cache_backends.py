@@ -0,0 +1,259 @@
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+
+from aioredis import Redis
+
+from core import config
+
+# Признак сжатого значения. Записи кеша начинаются с json-заголовка,
+# счётчики — с цифры, поэтому нулевой байт их не спутает
+COMPRESSED = b'\x00z'
+
+Value = Union[bytes, str, int]
+
+
+def key_family(key: str) -> str:
+    # film:<id> -> film, films:<generation>:<hash> -> films
+    return key.split(':', 1)[0]
+
+
+class CacheBackend(ABC):
+    """
+    Хранилище кеша ответов FilmService.
+    Значения не меньше compress_min_size байт прозрачно сжимаются
+    (0 — не сжимать), поэтому в том же объёме памяти помещается больше
+    фильмов с полным составом.
+    """
+
+    def __init__(
+            self,
+            compress_min_size: int = config.CACHE_COMPRESS_MIN_SIZE,
+            compress_level: int = config.CACHE_COMPRESS_LEVEL):
+        self.compress_min_size = compress_min_size
+        self.compress_level = compress_level
+
+    def encode(self, value: Value) -> bytes:
+        if isinstance(value, int):
+            value = str(value)
+        if isinstance(value, str):
+            value = value.encode()
+        if self.compress_min_size and len(value) >= self.compress_min_size:
+            return COMPRESSED + zlib.compress(value, self.compress_level)
+        return value
+
+    @staticmethod
+    def decode(data: Optional[bytes]) -> Optional[bytes]:
+        if data is not None and data.startswith(COMPRESSED):
+            return zlib.decompress(data[len(COMPRESSED):])
+        return data
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, value: Value, expire: int):
+        pass
+
+    @abstractmethod
+    async def add(self, key: str, value: Value, expire: int) -> bool:
+        # Записывает значение, только если ключа ещё нет
+        pass
+
+    @abstractmethod
+    async def delete(self, key: str):
+        pass
+
+    @abstractmethod
+    async def exists_many(self, keys: List[str]) -> List[bool]:
+        pass
+
+    @abstractmethod
+    async def expire(self, key: str, expire: int):
+        pass
+
+    @abstractmethod
+    async def incr(self, key: str) -> int:
+        pass
+
+    @abstractmethod
+    async def memory_usage(self) -> Dict[str, dict]:
+        # Семейство ключей -> {'keys': число ключей, 'bytes': занятая память}
+        pass
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Кеш в Redis. Пакетные операции выполняются одним pipeline,
+    то есть за один сетевой round trip.
+    """
+
+    def __init__(self, redis: Redis, **kwargs):
+        super().__init__(**kwargs)
+        self.redis = redis
+
+    async def get(self, key):
+        return self.decode(await self.redis.get(key))
+
+    async def set(self, key, value, expire):
+        await self.redis.set(key, self.encode(value), expire=expire)
+
+    async def add(self, key, value, expire):
+        return bool(await self.redis.set(
+            key, self.encode(value),
+            expire=expire,
+            exist=self.redis.SET_IF_NOT_EXIST,
+        ))
+
+    async def delete(self, key):
+        await self.redis.delete(key)
+
+    async def exists_many(self, keys):
+        pipe = self.redis.pipeline()
+        for key in keys:
+            pipe.exists(key)
+        return [bool(exists) for exists in await pipe.execute()]
+
+    async def expire(self, key, expire):
+        await self.redis.expire(key, expire)
+
+    async def incr(self, key):
+        return await self.redis.incr(key)
+
+    async def memory_usage(
+            self,
+            sample: int = config.CACHE_MEMORY_SAMPLE,
+            scan_limit: int = config.CACHE_MEMORY_SCAN_LIMIT):
+        # Обходит (SCAN) не больше scan_limit ключей и вызывает MEMORY USAGE
+        # только для первых sample ключей каждого семейства. Порядок SCAN
+        # определяется хешами ключей, поэтому обойдённая часть — случайная
+        # выборка, и результат экстраполируется на всю базу (DBSIZE)
+        # https://redis.io/commands/memory-usage
+        stats: Dict[str, dict] = {}
+        scanned = 0
+        async for key in self.redis.iscan(count=1000):
+            family = stats.setdefault(
+                key_family(key.decode()),
+                {'keys': 0, 'sampled': 0, 'sampled_bytes': 0},
+            )
+            family['keys'] += 1
+            if family['sampled'] < sample:
+                family['sampled'] += 1
+                family['sampled_bytes'] += await self.redis.execute(
+                    b'MEMORY', b'USAGE', key
+                ) or 0
+            scanned += 1
+            if scanned >= scan_limit:
+                break
+        scale = max(await self.redis.dbsize(), scanned) / scanned if scanned else 0
+        result = {}
+        for name, family in stats.items():
+            keys = round(family['keys'] * scale)
+            result[name] = {
+                'keys': keys,
+                'bytes': family['sampled_bytes'] * keys // family['sampled'],
+            }
+        return result
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Кеш в памяти процесса: LRU не больше max_items записей с TTL.
+    Не требует Redis, но не разделяется между воркерами.
+    """
+
+    def __init__(self, max_items: int = config.CACHE_MEMORY_MAX_ITEMS, **kwargs):
+        super().__init__(**kwargs)
+        self.max_items = max_items
+        # ключ -> (момент истечения или None, значение)
+        self._items: 'OrderedDict[str, Tuple[Optional[float], bytes]]' = OrderedDict()
+
+    def _get(self, key: str) -> Optional[bytes]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expire_at, data = item
+        if expire_at is not None and expire_at <= time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return data
+
+    def _set(self, key: str, data: bytes, expire: Optional[int]):
+        expire_at = time.monotonic() + expire if expire else None
+        self._items[key] = (expire_at, data)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    async def get(self, key):
+        return self.decode(self._get(key))
+
+    async def set(self, key, value, expire):
+        self._set(key, self.encode(value), expire)
+
+    async def add(self, key, value, expire):
+        if self._get(key) is not None:
+            return False
+        self._set(key, self.encode(value), expire)
+        return True
+
+    async def delete(self, key):
+        self._items.pop(key, None)
+
+    async def exists_many(self, keys):
+        return [self._get(key) is not None for key in keys]
+
+    async def expire(self, key, expire):
+        data = self._get(key)
+        if data is not None:
+            self._set(key, data, expire)
+
+    async def incr(self, key):
+        # Как и в Redis, счётчик сохраняет прежний TTL
+        value = int(self._get(key) or 0) + 1
+        item = self._items.get(key)
+        expire_at = item[0] if item else None
+        self._items[key] = (expire_at, str(value).encode())
+        return value
+
+    async def memory_usage(self):
+        stats: Dict[str, dict] = {}
+        for key, (_expire_at, data) in self._items.items():
+            family = stats.setdefault(key_family(key), {'keys': 0, 'bytes': 0})
+            family['keys'] += 1
+            family['bytes'] += len(key) + len(data)
+        return stats
+
+
+class NullCacheBackend(CacheBackend):
+    """
+    Кеш, который ничего не хранит: каждый запрос идёт в Elasticsearch.
+    """
+
+    async def get(self, key):
+        return None
+
+    async def set(self, key, value, expire):
+        pass
+
+    async def add(self, key, value, expire):
+        return True
+
+    async def delete(self, key):
+        pass
+
+    async def exists_many(self, keys):
+        return [False] * len(keys)
+
+    async def expire(self, key, expire):
+        pass
+
+    async def incr(self, key):
+        return 0
+
+    async def memory_usage(self):
+        return {}
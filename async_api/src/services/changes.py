@@ -0,0 +1,253 @@
+import asyncio
+import logging
+import time
+
+import orjson
+from aioredis import Redis, ReplyError
+from elasticsearch import AsyncElasticsearch
+
+from core import config
+from services.cache_backends import CacheBackend, MemoryCacheBackend
+from services.film import FilmService
+from services.genre import GenreService
+from services.person import PersonService
+from services.limiter import ElasticGuard
+
+logger = logging.getLogger(__name__)
+
+# Сколько ждать новых событий за один вызов XREADGROUP, мс
+BLOCK_TIMEOUT_MS = 5000
+# Сколько событий за раз перечитывать из своих необработанных
+PENDING_BATCH = 100
+# События, которые столько мс не подтверждены другим (например, упавшим)
+# воркером, забираются себе; проверка — раз в CLAIM_INTERVAL секунд
+CLAIM_MIN_IDLE_MS = 60000
+CLAIM_INTERVAL = 30
+# После стольких доставок событие переносится в CHANGES_DEAD_STREAM
+# и подтверждается: иначе оно навсегда задержало бы все следующие
+MAX_DELIVERIES = 5
+DEAD_STREAM_MAXLEN = 1000
+# Потребители без необработанных событий, которые столько мс не читали
+# поток (остановленные воркеры), удаляются из группы
+CONSUMER_MAX_IDLE_MS = 10 * 60 * 1000
+
+
+async def create_group(redis: Redis, latest_id: str = '$'):
+    try:
+        await redis.xgroup_create(
+            config.CHANGES_STREAM, config.CHANGES_GROUP,
+            latest_id=latest_id, mkstream=True
+        )
+    except ReplyError as err:
+        # Группа уже создана другим воркером
+        if 'BUSYGROUP' not in str(err):
+            raise
+
+
+async def claim_abandoned(redis: Redis, consumer: str):
+    # Имена потребителей — api-<pid>, поэтому события, не подтверждённые
+    # перезапущенным воркером, никто другой не прочитает.
+    # XAUTOCLAIM (Redis 6.2+) переносит их в необработанные этого воркера.
+    # В aioredis 1.3 команды нет, вызываем её напрямую
+    start = b'0-0'
+    while True:
+        reply = await redis.execute(
+            b'XAUTOCLAIM', config.CHANGES_STREAM, config.CHANGES_GROUP,
+            consumer, CLAIM_MIN_IDLE_MS, start, b'COUNT', PENDING_BATCH,
+        )
+        start, claimed = reply[0], reply[1]
+        if claimed:
+            logger.warning(f'Забрано {len(claimed)} необработанных событий')
+        if start == b'0-0':
+            break
+
+
+async def remove_idle_consumers(redis: Redis, consumer: str):
+    # Имена потребителей уникальны для процесса и не переиспользуются,
+    # поэтому остановленные воркеры копятся в группе. Их события к этому
+    # моменту уже забраны XAUTOCLAIM
+    consumers = await redis.xinfo_consumers(
+        config.CHANGES_STREAM, config.CHANGES_GROUP
+    )
+    for info in consumers:
+        name = info[b'name']
+        if name.decode() == consumer or info[b'pending']:
+            continue
+        if info[b'idle'] >= CONSUMER_MAX_IDLE_MS:
+            await redis.xgroup_delconsumer(
+                config.CHANGES_STREAM, config.CHANGES_GROUP, name
+            )
+            logger.info(f'Удалён неактивный потребитель {name.decode()}')
+
+
+async def read_entries(redis: Redis, consumer: str) -> tuple:
+    """
+    Возвращает (события, перечитаны ли они из необработанных).
+    Сначала свои необработанные события (id 0): те, на которых обработчик
+    упал, и забранные у других воркеров. '>' отдаёт только новые
+    """
+    entries = await redis.xread_group(
+        config.CHANGES_GROUP, consumer,
+        [config.CHANGES_STREAM],
+        timeout=None,
+        count=PENDING_BATCH,
+        latest_ids=['0'],
+    )
+    if entries:
+        return entries, True
+    entries = await redis.xread_group(
+        config.CHANGES_GROUP, consumer,
+        [config.CHANGES_STREAM],
+        timeout=BLOCK_TIMEOUT_MS,
+        latest_ids=['>'],
+    )
+    return entries, False
+
+
+async def delivery_counts(redis: Redis, consumer: str, entries: list) -> dict:
+    # id события -> сколько раз оно доставлено (XPENDING), включая текущую
+    pending = await redis.xpending(
+        config.CHANGES_STREAM, config.CHANGES_GROUP,
+        entries[0][1], entries[-1][1], len(entries), consumer,
+    )
+    return {entry_id: deliveries for entry_id, _, _, deliveries in pending}
+
+
+async def dead_letter(redis: Redis, entry_id: bytes, fields):
+    logger.error(
+        f'Событие {entry_id} не обработано за {MAX_DELIVERIES} попыток, '
+        f'переносим в {config.CHANGES_DEAD_STREAM}: {fields}'
+    )
+    await redis.xadd(
+        config.CHANGES_DEAD_STREAM,
+        {**(fields or {}), b'entry_id': entry_id},
+        max_len=DEAD_STREAM_MAXLEN,
+    )
+
+
+async def last_entry_id(redis: Redis) -> bytes:
+    # Id последнего события потока; b'0-0', если потока ещё нет
+    entries = await redis.xrevrange(config.CHANGES_STREAM, count=1)
+    return entries[0][0] if entries else b'0-0'
+
+
+def entry_order(entry_id: bytes) -> tuple:
+    # b'1650000000000-1' -> (1650000000000, 1)
+    ms, seq = entry_id.split(b'-')
+    return int(ms), int(seq)
+
+
+async def handle_entry(handlers: dict, entry_id, fields):
+    try:
+        ids = orjson.loads(fields[b'ids']) if fields else None
+    except (KeyError, ValueError):
+        # Повреждённое событие не станет корректным при повторе
+        logger.error(f'Некорректное событие {entry_id}: {fields}')
+        ids = None
+    handler = handlers.get((fields or {}).get(b'index', b'movies'))
+    if handler is not None and ids is not None:
+        await handler(ids)
+
+
+async def listen_changes(
+        redis: Redis,
+        cache: CacheBackend,
+        elastic: AsyncElasticsearch,
+        guard: ElasticGuard,
+        consumer: str):
+    """
+    Читает поток изменений, который публикует ETL, и инвалидирует кеш.
+    Общий кеш (Redis) достаточно инвалидировать один раз, поэтому воркеры
+    объединены в consumer group и каждое событие обрабатывает один воркер.
+    Кеш в памяти процесса есть у каждого воркера свой, поэтому с ним
+    каждый воркер читает все события сам (см. listen_broadcast).
+    """
+    film_service = FilmService(cache, elastic, guard, redis)
+    person_service = PersonService(cache, elastic, guard, redis)
+    genre_service = GenreService(cache, elastic, guard, redis)
+    handlers = {
+        b'movies': film_service.on_films_changed,
+        b'persons': person_service.on_persons_changed,
+        b'genres': genre_service.on_genres_changed,
+    }
+    if isinstance(cache, MemoryCacheBackend):
+        await listen_broadcast(redis, handlers)
+    else:
+        await listen_group(redis, handlers, consumer)
+
+
+async def listen_group(redis: Redis, handlers: dict, consumer: str):
+    # Событие подтверждается только после успешной обработки;
+    # иначе оно перечитывается на следующем шаге, но не больше
+    # MAX_DELIVERIES раз
+    await create_group(redis)
+    claimed_at = 0.0
+    recreate_group = False
+    while True:
+        try:
+            if recreate_group:
+                # Поток пересоздан вместе с группой: всё, что в нём есть,
+                # опубликовано после сброса, поэтому читаем с начала
+                await create_group(redis, latest_id='0')
+                recreate_group = False
+            if time.monotonic() - claimed_at >= CLAIM_INTERVAL:
+                await claim_abandoned(redis, consumer)
+                await remove_idle_consumers(redis, consumer)
+                claimed_at = time.monotonic()
+            entries, pending = await read_entries(redis, consumer)
+            deliveries = {}
+            if pending:
+                deliveries = await delivery_counts(redis, consumer, entries)
+            for _stream, entry_id, fields in entries:
+                if deliveries.get(entry_id, 0) > MAX_DELIVERIES:
+                    await dead_letter(redis, entry_id, fields)
+                else:
+                    await handle_entry(handlers, entry_id, fields)
+                await redis.xack(
+                    config.CHANGES_STREAM, config.CHANGES_GROUP, entry_id
+                )
+        except asyncio.CancelledError:
+            raise
+        except ReplyError as err:
+            if 'NOGROUP' in str(err):
+                # Redis перезапущен или очищен вместе с группой
+                logger.warning('Группа потока изменений пропала, создаём заново')
+                recreate_group = True
+                continue
+            logger.error(f'Ошибка обработки потока изменений: {err}')
+            await asyncio.sleep(1)
+        except Exception as err:
+            logger.error(f'Ошибка обработки потока изменений: {err}')
+            await asyncio.sleep(1)
+
+
+async def listen_broadcast(redis: Redis, handlers: dict):
+    # Обычный XREAD без группы: события не подтверждаются, воркер сам
+    # помнит id последнего обработанного. При ошибке обработчика событие
+    # перечитывается, потому что позиция сдвигается только после успеха.
+    # Кеш в памяти начинается пустым, поэтому читаем с конца потока
+    latest_id = None
+    while True:
+        try:
+            if latest_id is None:
+                latest_id = await last_entry_id(redis)
+            entries = await redis.xread(
+                [config.CHANGES_STREAM],
+                timeout=BLOCK_TIMEOUT_MS,
+                latest_ids=[latest_id],
+            )
+            for _stream, entry_id, fields in entries:
+                await handle_entry(handlers, entry_id, fields)
+                latest_id = entry_id
+            if not entries:
+                # Redis очищен и поток создан заново с меньшими id:
+                # с прежней позиции новые события не прочитать
+                last_id = await last_entry_id(redis)
+                if entry_order(last_id) < entry_order(latest_id):
+                    logger.warning('Поток изменений пересоздан, читаем с начала')
+                    latest_id = b'0-0'
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            logger.error(f'Ошибка обработки потока изменений: {err}')
+            await asyncio.sleep(1)
@@ -0,0 +1,23 @@
+class ServiceUnavailableError(Exception):
+    """
+    Хранилище (Elasticsearch) сейчас недоступно или перегружено.
+    Обработчик в main.py превращает ошибку в ответ 503 с Retry-After.
+    """
+
+    def __init__(self, detail: str = 'service unavailable', retry_after: int = 1):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class StorageRequestError(Exception):
+    """
+    Хранилище отклонило сам запрос (4xx, кроме 404): кластер исправен,
+    ошибка в запросе. Обработчик в main.py отвечает 400 на 400 от ES
+    и 500 на остальные коды, без Retry-After.
+    """
+
+    def __init__(self, status_code: int, detail: str = 'bad request'):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
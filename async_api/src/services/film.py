@@ -1,61 +1,146 @@
-from typing import Optional
+import hashlib
+import logging
+from functools import partial
+from typing import AsyncIterator, List, Optional
 from models.film import Film
-import json
+from models.schema_film import FilmFilters, FullFilm, ShortFilm
+from services.base import (
+    ES_FAILURES, CachedService, render, source_fields, storage_error
+)
+from services.cache import CacheEntry
+from services.cache_backends import CacheBackend
+from services.errors import ServiceUnavailableError
+from services.limiter import ElasticGuard
+from services import popularity
+import orjson
 
 from functools import lru_cache
 from aioredis import Redis
 from elasticsearch import AsyncElasticsearch
+from elasticsearch.exceptions import TransportError
 from fastapi import Depends
 
-from db.elastic import get_elastic
+from core import config
+from core.metrics import observe_es_took, timed
+from db.cache import get_cache
+from db.elastic import get_elastic, get_elastic_guard
 from db.redis import get_redis
 
-FILM_CACHE_EXPIRE_IN_SECONDS = 60 * 5
+logger = logging.getLogger(__name__)
 
-class FilmService:
+FILM_CACHE_EXPIRE_IN_SECONDS = config.FILM_CACHE_EXPIRE_IN_SECONDS
+FILM_CACHE_STALE_IN_SECONDS = config.FILM_CACHE_STALE_IN_SECONDS
+FILMS_CACHE_EXPIRE_IN_SECONDS = config.FILMS_CACHE_EXPIRE_IN_SECONDS
+FILMS_CACHE_STALE_IN_SECONDS = config.FILMS_CACHE_STALE_IN_SECONDS
+FILMS_TRACK_TOTAL_HITS = config.FILMS_TRACK_TOTAL_HITS
 
+# Счётчик поколений кеша списков. Увеличивается при любом изменении фильмов,
+# после чего старые страницы просто перестают читаться и истекают по TTL
+FILMS_GENERATION_KEY = 'films:generation'
 
-    def __init__(self, redis: Redis, elastic: AsyncElasticsearch):
-        self.redis = redis
-        self.elastic = elastic
 
-    # get_by_id возвращает объект фильма. Он опционален, так как фильм может отсутствовать в базе
-    async def get_by_id(self, film_id: str) -> Optional[Film]:
-        # Пытаемся получить данные из кеша, потому что оно работает быстрее
-        film = await self._film_from_cache(film_id)
-        if not film:
-            # Если фильма нет в кеше, то ищем его в Elasticsearch
-            film = await self._get_film_from_elastic(film_id)
-            if not film:
-                # Если он отсутствует в Elasticsearch, значит, фильма вообще нет в базе
-                return None
-            # Сохраняем фильм  в кеш
-            await self._put_film_to_cache(film)
-        return film
+def film_key(film_id: str) -> str:
+    return f'film:{film_id}'
+
+
+def films_key(generation: int, query: dict) -> str:
+    digest = hashlib.md5(
+        orjson.dumps(query, option=orjson.OPT_SORT_KEYS)
+    ).hexdigest()
+    return f'films:{generation}:{digest}'
+
+
+FULL_FILM_FIELDS = source_fields(FullFilm)
+SHORT_FILM_FIELDS = source_fields(ShortFilm)
+EXPORT_FIELDS = source_fields(Film)
+
+# Выгрузка каталога: размер страницы и время жизни point in time
+EXPORT_PAGE_SIZE = 1000
+EXPORT_KEEP_ALIVE = '1m'
+
+
+def export_fields(raw: Optional[str]) -> List[str]:
+    # Поля выгрузки через запятую; по умолчанию — поля ShortFilm
+    if not raw:
+        return SHORT_FILM_FIELDS
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    unknown = set(fields) - set(EXPORT_FIELDS)
+    if unknown:
+        raise ValueError(f'unknown fields: {", ".join(sorted(unknown))}')
+    return fields
+
+
+def render_film(film: FullFilm) -> bytes:
+    return render(film.dict())
 
-    async def _get_film_from_elastic(self, film_id: str) -> Optional[Film]:
-        try:
-            doc = await self.elastic.get('movies', film_id)
-        except Exception as err:
-            return None
-        return Film(**doc['_source'])
 
-    async def _film_from_cache(self, film_id: str) -> Optional[Film]:
-        # Пытаемся получить данные о фильме из кеша, используя команду get
-        # https://redis.io/commands/get
-        data = await self.redis.get(film_id)
-        if not data:
+def render_films(
+        total: int, relation: str, page: int, films: List[dict]) -> bytes:
+    # relation как у ES: 'eq' — total точный, 'gte' — совпадений не меньше
+    return render({
+        'total': total,
+        'total_relation': relation,
+        'page': page,
+        'result': [ShortFilm(**film).dict() for film in films],
+    })
+
+
+class FilmService(CachedService):
+
+    # get_by_id возвращает объект фильма. Он опционален, так как фильм может отсутствовать в базе
+    async def get_by_id(self, film_id: str) -> Optional[FullFilm]:
+        entry = await self.get_by_id_raw(film_id)
+        if not entry:
             return None
-        # pydantic предоставляет удобное API для создания объекта моделей из json
-        film = Film.parse_raw(data)
-        return film
+        return FullFilm.parse_raw(entry.body)
+
+    # get_by_id_raw возвращает готовое тело ответа (json) для фильма и его ETag
+    # count=False — не учитывать обращение в популярности
+    async def get_by_id_raw(
+            self, film_id: str, count: bool = True) -> Optional[CacheEntry]:
+        return await self._get_or_load(
+            film_key(film_id),
+            partial(self._load_film, film_id),
+            FILM_CACHE_STALE_IN_SECONDS,
+            FILM_CACHE_EXPIRE_IN_SECONDS,
+            track=(popularity.FILMS, film_id),
+            count=count,
+        )
 
-    async def _put_film_to_cache(self, film: Film):
-        # Сохраняем данные о фильме, используя команду set
-        # Выставляем время жизни кеша — 5 минут
-        # https://redis.io/commands/set
-        # pydantic позволяет сериализовать модель в json
-        await self.redis.set(film.id, film.json(), expire=FILM_CACHE_EXPIRE_IN_SECONDS)
+    async def _load_film(self, film_id: str) -> Optional[bytes]:
+        film = await self._get_film_from_elastic(film_id)
+        if not film:
+            # Если он отсутствует в Elasticsearch, значит, фильма вообще нет в базе
+            return None
+        # Валидация модели ответа и расчёт ETag происходят только здесь,
+        # при заполнении кеша
+        with timed('model'):
+            return render_film(film)
+
+    async def _get_film_from_elastic(self, film_id: str) -> Optional[FullFilm]:
+        source = await self._get_source('movies', film_id, FULL_FILM_FIELDS)
+        if source is None:
+            return None
+        with timed('model'):
+            return FullFilm(**source)
+
+    async def on_films_changed(self, film_ids: List[str]):
+        # Вызывается при получении события от ETL.
+        # Популярные фильмы (те, что уже были в кеше) сразу прогреваем заново,
+        # остальные просто удаляем из кеша
+        keys = [film_key(film_id) for film_id in film_ids]
+        # Наличие всех ключей проверяем одним запросом
+        cached = await self.cache.exists_many(keys)
+        for film_id, key, exists in zip(film_ids, keys, cached):
+            if not exists:
+                continue
+            await self._load_to_cache(
+                key,
+                partial(self._load_film, film_id),
+                FILM_CACHE_STALE_IN_SECONDS,
+                FILM_CACHE_EXPIRE_IN_SECONDS,
+            )
+        await self.cache.incr(FILMS_GENERATION_KEY)
 
     search_fields: list = [
         'actors_names',
@@ -68,98 +153,310 @@ class FilmService:
     max_docs: int = 250
     limit: int = 25
 
-    async def get_many_films(self, query_films):
-        hash_query = hash(frozenset(query_films.dict().items()))
-        data = await self._films_from_cache(hash_query)
-        if not data:
-            data = await self._get_many_film_from_elastic(query_films)
-            if not data:
-                return None
-            await self._put_many_film_to_cache(hash_query, data)
-        print(data)
-        return data
+    async def get_many_films(self, query_films) -> dict:
+        entry = await self.get_many_films_raw(query_films)
+        return orjson.loads(entry.body)
+
+    # get_many_films_raw возвращает готовое тело ответа (json) со страницей фильмов
+    # Некорректная строка filters приводит к ValueError
+    async def get_many_films_raw(
+            self, query_films, count: bool = True) -> CacheEntry:
+        filters = FilmFilters.parse(query_films.filters)
+        # В ключ кеша попадает нормализованный набор фильтров
+        query = {**query_films.dict(), 'filters': filters.dict()}
+        generation = int(await self.cache.get(FILMS_GENERATION_KEY) or 0)
+        search = orjson.dumps(
+            query_films.dict(), option=orjson.OPT_SORT_KEYS
+        ).decode()
+        return await self._get_or_load(
+            films_key(generation, query),
+            partial(self._load_films, query_films, filters),
+            FILMS_CACHE_STALE_IN_SECONDS,
+            FILMS_CACHE_EXPIRE_IN_SECONDS,
+            track=(popularity.SEARCHES, search),
+            count=count,
+        )
+
+    async def _load_films(self, query_films, filters: FilmFilters) -> bytes:
+        # Самые частые страницы берём из готовых рейтингов,
+        # в ES идут только остальные запросы
+        films_page = await self._get_ranked_page(query_films, filters)
+        if films_page is None:
+            films_page = await self._get_many_film_from_elastic(
+                query_films, filters
+            )
+        total, relation, page, films = films_page
+        with timed('model'):
+            return render_films(total, relation, page, films)
+
 
+    async def _get_ranked_page(self, query_films, filters: FilmFilters):
+        # Рейтинги есть только для сортировки по рейтингу без поиска
+        # и без фильтров, кроме одного жанра
+        if self.redis is None:
+            return None
+        if query_films.query or query_films.sort != 'rating':
+            return None
+        if (filters.type or filters.person or len(filters.genre) > 1
+                or filters.rating_gte is not None
+                or filters.rating_lte is not None):
+            return None
+        key = ranked_key(filters.genre[0] if filters.genre else None)
+        with timed('cache_get'):
+            pipe = self.redis.pipeline()
+            pipe.exists(config.RANKED_READY)
+            pipe.zcard(key)
+            ready, total = await pipe.execute()
+            if not ready:
+                return None
+            start, page = get_page_bounds(
+                min(total, self.max_docs), query_films.page, self.limit
+            )
+            ids = await self.redis.zrevrange(key, start, start + self.limit - 1)
+            payloads = await self.redis.hmget(config.RANKED_FILMS, *ids) if ids else []
+        if any(payload is None for payload in payloads):
+            # Рейтинг и данные фильмов рассинхронизированы, идём в ES
+            return None
+        # Тот же запрос в ES считает совпадения только до
+        # FILMS_TRACK_TOTAL_HITS, поэтому и здесь total ограничен ими:
+        # ответ не зависит от того, откуда взята страница
+        relation = 'eq'
+        if total > FILMS_TRACK_TOTAL_HITS:
+            total, relation = FILMS_TRACK_TOTAL_HITS, 'gte'
+        films = [orjson.loads(payload) for payload in payloads]
+        return total, relation, page, films
 
-    async def _get_many_film_from_elastic(self, query_films):
+    async def _get_many_film_from_elastic(self, query_films, filters: FilmFilters):
 
         es_query = dict()
         es_query['size'] = self.max_docs
-
-        # Смотрим есть ли запрос, то формируем корректный запрос для ES
-        if query_films.query:
-            es_query['query'] = get_query(
-                fields=self.search_fields,
-                query=query_films.query
-            )
+        # Забираем из ES только поля, которые попадут в ShortFilm
+        es_query['_source'] = SHORT_FILM_FIELDS
+
+        # Смотрим есть ли запрос или фильтры, то формируем корректный запрос для ES.
+        # При сортировке по полю score не нужен, и запрос целиком
+        # выполняется в filter context
+        query = get_query(
+            fields=self.search_fields,
+            query=query_films.query,
+            filters=filters,
+            scored=not query_films.sort
+        )
+        if query:
+            es_query['query'] = query
 
         # Смотрим нужна ли сортировка, и по какому полю
         # по которому буду сортироваться данные
         if query_films.sort:
-            es_query['sort'] = [get_sort(query_films.sort)]
+            es_query['sort'] = get_sort(query_films.sort)
+        if query_films.sort == 'rating':
+            # Сортировка совпадает с index.sort индекса movies: ES читает
+            # сегменты в порядке рейтинга и прекращает обход, набрав
+            # страницу и FILMS_TRACK_TOTAL_HITS совпадений
+            es_query['track_total_hits'] = FILMS_TRACK_TOTAL_HITS
 
         # Получаем все данные
-        result = await self.elastic.search(index='movies', body=es_query)
+        try:
+            async with self.guard.call(self.guard.search, ES_FAILURES):
+                with timed('es'):
+                    result = await self.elastic.search(
+                        index='movies', body=es_query
+                    )
+        except TransportError as err:
+            raise storage_error(err) from err
+        observe_es_took(result['took'])
         total = result['hits']['total']['value']
+        relation = result['hits']['total']['relation']
 
         # TODO paginator
         films, curent_page = get_data_page(
             total, result, query_films.page, self.limit
         )
-        return total, curent_page, films
-
-
-    async def _films_from_cache(self, hash_query: hash) -> Optional[Film]:
-
-        data = await self.redis.get(hash_query)
-        if not data:
-            return None
-        film = Film.parse_raw(data)
-        return film
-
+        return total, relation, curent_page, films
+
+
+    async def export_films(
+            self,
+            filters: FilmFilters,
+            fields: List[str]) -> AsyncIterator[bytes]:
+        """
+        Выгружает весь каталог в NDJSON, обходя индекс через
+        point in time + search_after. Каждая страница запрашивается,
+        только когда клиент дочитал предыдущую, поэтому память
+        на одну выгрузку не зависит от размера каталога.
+        PIT и первая страница запрашиваются до ответа: недоступность ES
+        превращается в 503, а не в 200 с пустым телом. Возвращает
+        итератор страниц для StreamingResponse.
+        """
+        es_query = {
+            'size': EXPORT_PAGE_SIZE,
+            '_source': fields,
+            # _shard_doc — самый дешёвый стабильный порядок обхода
+            'sort': [{'_shard_doc': 'asc'}],
+            'track_total_hits': False,
+        }
+        query = get_query(self.search_fields, None, filters)
+        if query:
+            es_query['query'] = query
+        pit_id = await self._open_pit()
+        try:
+            result = await self._export_page(es_query, pit_id)
+        except TransportError as err:
+            await self._close_pit(pit_id)
+            raise storage_error(err) from err
+        except BaseException:
+            await self._close_pit(pit_id)
+            raise
+        return self._export_pages(es_query, result)
+
+    async def _export_page(self, es_query: dict, pit_id: str) -> dict:
+        es_query['pit'] = {'id': pit_id, 'keep_alive': EXPORT_KEEP_ALIVE}
+        async with self.guard.call(self.guard.search, ES_FAILURES):
+            return await self.elastic.search(body=es_query)
+
+    async def _export_pages(
+            self, es_query: dict, result: dict) -> AsyncIterator[bytes]:
+        # Заголовки уже отправлены: ошибка дальше только обрывает выгрузку
+        pit_id = result.get('pit_id', es_query['pit']['id'])
+        try:
+            while True:
+                hits = result['hits']['hits']
+                if not hits:
+                    break
+                pit_id = result.get('pit_id', pit_id)
+                es_query['search_after'] = hits[-1]['sort']
+                yield b''.join(
+                    orjson.dumps(hit['_source']) + b'\n' for hit in hits
+                )
+                result = await self._export_page(es_query, pit_id)
+        except (TransportError, ServiceUnavailableError) as err:
+            logger.error(f'Выгрузка прервана: {err}')
+            raise
+        finally:
+            await self._close_pit(pit_id)
+
+    async def _open_pit(self) -> str:
+        # Клиент elasticsearch 7.9 ещё не умеет PIT, поэтому обращаемся
+        # к API напрямую
+        try:
+            async with self.guard.call(self.guard.search, ES_FAILURES):
+                result = await self.elastic.transport.perform_request(
+                    'POST', '/movies/_pit',
+                    params={'keep_alive': EXPORT_KEEP_ALIVE}
+                )
+        except TransportError as err:
+            raise storage_error(err) from err
+        return result['id']
+
+    async def _close_pit(self, pit_id: str):
+        try:
+            await self.elastic.transport.perform_request(
+                'DELETE', '/_pit', body={'id': pit_id}
+            )
+        except TransportError as err:
+            # PIT всё равно истечёт по keep_alive
+            logger.warning(f'Не удалось закрыть point in time: {err}')
 
-    async def _put_many_film_to_cache(self, hash_query: hash, films):
-        data = json.dumps(films)
-        await self.redis.set(hash_query, data, expire=FILM_CACHE_EXPIRE_IN_SECONDS)
 
 def get_sort(field: str):
+    # Сортировка по рейтингу повторяет index.sort (etl/pg_to_es/schema),
+    # иначе ES не сможет завершить запрос досрочно. По той же причине
+    # без numeric_type: он меняет тип сортировки поля.
+    # Равные рейтинги упорядочены по id по убыванию — так же, как
+    # ZREVRANGE упорядочивает готовые рейтинги, поэтому страницы из
+    # обоих источников совпадают
     sort_params = {
-        'rating': {
-            'imdb_rating': {"numeric_type": "double", "order": "desc"}
-
-        },
-        "title": {"title.raw": {"order": "desc"}}
+        'rating': [
+            {'imdb_rating': {"order": "desc"}},
+            {'id': {"order": "desc"}}
+        ],
+        "title": [{"title.raw": {"order": "desc"}}]
     }
     return sort_params.get(field)
 
-def get_query(fields: list, query):
-    return {
+def get_filter(filters: FilmFilters) -> List[dict]:
+    # Фильтры выполняются в filter context: они не влияют на score
+    # и кешируются на стороне ES (node query cache)
+    clauses = []
+    if filters.genre:
+        clauses.append({'terms': {'genre': filters.genre}})
+    if filters.type:
+        clauses.append({'terms': {'type': filters.type}})
+    rating = {}
+    if filters.rating_gte is not None:
+        rating['gte'] = filters.rating_gte
+    if filters.rating_lte is not None:
+        rating['lte'] = filters.rating_lte
+    if rating:
+        clauses.append({'range': {'imdb_rating': rating}})
+    if filters.person:
+        # actors и writers — object-поля (nested несовместим с index.sort),
+        # для совпадения по одному полю id этого достаточно
+        clauses.append({'bool': {'should': [
+            {'terms': {f'{path}.id': filters.person}}
+            for path in ('actors', 'writers')
+        ]}})
+    return clauses
+
+
+def get_query(
+        fields: list,
+        query,
+        filters: Optional[FilmFilters] = None,
+        scored: bool = True):
+    clauses = get_filter(filters) if filters else []
+    if not query and not clauses:
+        return None
+    match = {
         'multi_match': {
             'query': query,
             'fields': fields
         }
     }
+    if not scored:
+        # Без подсчёта score: поиск работает как фильтр
+        return {'bool': {'filter': ([match] if query else []) + clauses}}
+    if not clauses:
+        return match
+    return {
+        'bool': {
+            'must': [match] if query else [],
+            'filter': clauses
+        }
+    }
+
+def get_page_bounds(available: int, num_page: Optional[int], limit: int):
+    # Номер страницы начинается с 1; несуществующая страница заменяется первой
+    num_page = num_page or 1
+    start = limit * (num_page - 1)
+    if num_page < 1 or start >= available:
+        return 0, 1
+    return start, num_page
+
 
 def get_data_page(total, result, num_page, limit):
     data = [
         doc['_source']
         for doc in result['hits']['hits']
     ]
+    start, num_page = get_page_bounds(len(data), num_page, limit)
+    return data[start:start + limit], num_page
 
-    if limit * num_page > total or num_page == 0:
-        data = data[:limit]
-        num_page = 1
-        return data, num_page
 
-    size = limit * num_page - 1
-    return data[size:], num_page
+def ranked_key(genre: Optional[str]) -> str:
+    if genre is None:
+        return config.RANKED_ALL
+    return f'{config.RANKED_GENRE_PREFIX}{genre}'
 
 
 
 @lru_cache()
 def get_film_service(
+        cache: CacheBackend = Depends(get_cache),
         redis: Redis = Depends(get_redis),
-        elastic: AsyncElasticsearch = Depends(get_elastic)
+        elastic: AsyncElasticsearch = Depends(get_elastic),
+        guard: ElasticGuard = Depends(get_elastic_guard)
 ) -> FilmService:
-    return FilmService(redis, elastic)
+    return FilmService(cache, elastic, guard, redis)
 
 
@@ -0,0 +1,96 @@
+from functools import lru_cache, partial
+from typing import List, Optional
+
+from aioredis import Redis
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.exceptions import TransportError
+from fastapi import Depends
+
+from core import config
+from core.metrics import observe_es_took, timed
+from db.cache import get_cache
+from db.elastic import get_elastic, get_elastic_guard
+from db.redis import get_redis
+from models.schema_genre import Genre
+from services.base import (
+    ES_FAILURES, CachedService, render, source_fields, storage_error
+)
+from services.cache import CacheEntry
+from services.cache_backends import CacheBackend
+from services.limiter import ElasticGuard
+
+GENRE_CACHE_EXPIRE_IN_SECONDS = config.GENRE_CACHE_EXPIRE_IN_SECONDS
+GENRE_CACHE_STALE_IN_SECONDS = config.GENRE_CACHE_STALE_IN_SECONDS
+
+GENRE_FIELDS = source_fields(Genre)
+GENRES_KEY = 'genres:all'
+# Жанров немного, список отдаётся целиком
+MAX_GENRES = 1000
+
+
+def genre_key(genre_id: str) -> str:
+    return f'genre:{genre_id}'
+
+
+class GenreService(CachedService):
+    """
+    Жанры из индекса genres: число фильмов посчитано ETL заранее,
+    агрегаций по индексу movies на запрос нет.
+    """
+
+    async def get_by_id_raw(self, genre_id: str) -> Optional[CacheEntry]:
+        return await self._get_or_load(
+            genre_key(genre_id),
+            partial(self._load_genre, genre_id),
+            GENRE_CACHE_STALE_IN_SECONDS,
+            GENRE_CACHE_EXPIRE_IN_SECONDS,
+        )
+
+    async def get_all_raw(self) -> CacheEntry:
+        return await self._get_or_load(
+            GENRES_KEY,
+            self._load_genres,
+            GENRE_CACHE_STALE_IN_SECONDS,
+            GENRE_CACHE_EXPIRE_IN_SECONDS,
+        )
+
+    async def _load_genre(self, genre_id: str) -> Optional[bytes]:
+        source = await self._get_source('genres', genre_id, GENRE_FIELDS)
+        if source is None:
+            return None
+        with timed('model'):
+            return render(Genre(**source).dict())
+
+    async def _load_genres(self) -> bytes:
+        body = {
+            'size': MAX_GENRES,
+            'sort': [{'name': 'asc'}],
+            '_source': GENRE_FIELDS,
+        }
+        try:
+            async with self.guard.call(self.guard.search, ES_FAILURES):
+                with timed('es'):
+                    result = await self.elastic.search(index='genres', body=body)
+        except TransportError as err:
+            raise storage_error(err) from err
+        observe_es_took(result['took'])
+        with timed('model'):
+            return render([
+                Genre(**doc['_source']).dict()
+                for doc in result['hits']['hits']
+            ])
+
+    async def on_genres_changed(self, genre_ids: List[str]):
+        for genre_id in genre_ids:
+            await self.cache.delete(genre_key(genre_id))
+        await self.cache.delete(GENRES_KEY)
+
+
+@lru_cache()
+def get_genre_service(
+        cache: CacheBackend = Depends(get_cache),
+        redis: Redis = Depends(get_redis),
+        elastic: AsyncElasticsearch = Depends(get_elastic),
+        guard: ElasticGuard = Depends(get_elastic_guard)
+) -> GenreService:
+    return GenreService(cache, elastic, guard, redis)
@@ -0,0 +1,155 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+
+from services.errors import ServiceUnavailableError
+
+
+class ConcurrencyLimiter:
+    """
+    Ограничивает число одновременных запросов к хранилищу.
+    Запросы сверх лимита ждут в очереди ограниченной длины; если очередь
+    полна или место не освободилось за queue_timeout, запрос сразу
+    отклоняется (503), а не копится и не уходит в ES с опозданием.
+    """
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._waiting = 0
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self._semaphore.locked():
+            if self._waiting >= self.queue_size:
+                raise ServiceUnavailableError(f'{self.name}: queue is full')
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(
+                    self._semaphore.acquire(), timeout=self.queue_timeout
+                )
+            except asyncio.TimeoutError:
+                raise ServiceUnavailableError(f'{self.name}: queue timeout')
+            finally:
+                self._waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+
+class CircuitBreaker:
+    """
+    После failure_threshold ошибок подряд размыкается и reset_timeout секунд
+    сразу отклоняет запросы. Затем пропускает один пробный запрос
+    (half-open): при успехе замыкается, при ошибке снова размыкается.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def check(self):
+        # Отклоняет запрос, пока цепь разомкнута или уже идёт пробный запрос
+        if self._opened_at is None:
+            return
+        remaining = self._opened_at + self.reset_timeout - time.monotonic()
+        if remaining > 0 or self._probing:
+            raise ServiceUnavailableError(
+                'circuit breaker is open',
+                retry_after=max(1, math.ceil(remaining))
+            )
+
+    def before_call(self) -> bool:
+        """
+        Проверяет цепь перед самим запросом. Возвращает True, если запрос
+        стал пробным: тогда вызывающий обязан вызвать end_probe()
+        при любом исходе, в том числе при отмене.
+        """
+        self.check()
+        if self._opened_at is None:
+            return False
+        self._probing = True
+        return True
+
+    def end_probe(self):
+        # Пробный запрос завершился, не сообщив об успехе или отказе
+        # (отмена, ошибка не из failures): следующий запрос снова пробный
+        self._probing = False
+
+    def on_success(self):
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def on_failure(self):
+        self._failures += 1
+        self._probing = False
+        if self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+
+
+def is_cluster_failure(err: BaseException) -> bool:
+    # У ошибок соединения и таймаутов клиента ES status_code равен 'N/A'
+    status = getattr(err, 'status_code', None)
+    return not isinstance(status, int) or status == 429 or status >= 500
+
+
+class ElasticGuard:
+    """
+    Admission control для запросов к Elasticsearch: отдельные бюджеты
+    для дешёвых запросов по id и тяжёлых поисковых запросов
+    и общий circuit breaker на кластер.
+    """
+
+    def __init__(
+            self,
+            lookup: ConcurrencyLimiter,
+            search: ConcurrencyLimiter,
+            breaker: CircuitBreaker):
+        self.lookup = lookup
+        self.search = search
+        self.breaker = breaker
+
+    @asynccontextmanager
+    async def call(
+            self,
+            limiter: ConcurrencyLimiter,
+            failures: tuple,
+            ignored: tuple = ()):
+        """
+        failures — исключения запроса к кластеру; отказом кластера из них
+        считаются только ошибки соединения, таймауты, 429 и 5xx
+        (см. is_cluster_failure), ошибки в самом запросе (4xx) — нет.
+        ignored — исключения-ответы (например, 404), кластер при этом жив.
+        """
+        # Пока цепь разомкнута, отклоняем запрос, не занимая очередь
+        self.breaker.check()
+        async with limiter.acquire():
+            # Место пробного запроса занимаем только после очереди:
+            # запрос, отклонённый очередью, не должен его удерживать
+            probe = self.breaker.before_call()
+            try:
+                yield
+            except ignored:
+                self.breaker.on_success()
+                raise
+            except failures as err:
+                if is_cluster_failure(err):
+                    self.breaker.on_failure()
+                else:
+                    self.breaker.on_success()
+                raise
+            else:
+                self.breaker.on_success()
+            finally:
+                if probe:
+                    self.breaker.end_probe()
@@ -0,0 +1,133 @@
+import time
+from functools import lru_cache, partial
+from typing import List, Optional
+
+from aioredis import Redis
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.exceptions import TransportError
+from fastapi import Depends
+
+from core import config
+from core.metrics import observe_es_took, timed
+from db.cache import get_cache
+from db.elastic import get_elastic, get_elastic_guard
+from db.redis import get_redis
+from models.schema_film import ShortFilm
+from models.schema_person import PersonDetails
+from services.base import (
+    ES_FAILURES, CachedService, render, source_fields, storage_error
+)
+from services.cache import CacheEntry
+from services.cache_backends import CacheBackend
+from services.film import get_sort
+from services.limiter import ElasticGuard
+
+PERSON_CACHE_EXPIRE_IN_SECONDS = config.PERSON_CACHE_EXPIRE_IN_SECONDS
+PERSON_CACHE_STALE_IN_SECONDS = config.PERSON_CACHE_STALE_IN_SECONDS
+
+# Фильмов персоны на одной странице
+PERSON_FILMS_PAGE_SIZE = 50
+
+PERSON_FIELDS = source_fields(PersonDetails)
+SHORT_FILM_FIELDS = source_fields(ShortFilm)
+
+
+def person_key(person_id: str) -> str:
+    return f'person:{person_id}'
+
+
+def person_films_version_key(person_id: str) -> str:
+    return f'person_films:{person_id}:version'
+
+
+def person_films_key(person_id: str, version: int, page: int) -> str:
+    return f'person_films:{person_id}:{version}:{page}'
+
+
+class PersonService(CachedService):
+    """
+    Персоны из денормализованного индекса persons: документ персоны уже
+    содержит id всех её фильмов и роли, поэтому фильмы персоны загружаются
+    по id, без nested-запросов по индексу movies.
+    """
+
+    async def get_by_id_raw(self, person_id: str) -> Optional[CacheEntry]:
+        return await self._get_or_load(
+            person_key(person_id),
+            partial(self._load_person, person_id),
+            PERSON_CACHE_STALE_IN_SECONDS,
+            PERSON_CACHE_EXPIRE_IN_SECONDS,
+        )
+
+    async def get_films_raw(
+            self, person_id: str, page: int = 1) -> Optional[CacheEntry]:
+        # Страницы кешируются по отдельности; при изменении персоны меняется
+        # версия, и все её страницы разом перестают читаться
+        version = int(
+            await self.cache.get(person_films_version_key(person_id)) or 0
+        )
+        return await self._get_or_load(
+            person_films_key(person_id, version, page),
+            partial(self._load_films, person_id, page),
+            PERSON_CACHE_STALE_IN_SECONDS,
+            PERSON_CACHE_EXPIRE_IN_SECONDS,
+        )
+
+    async def _load_person(self, person_id: str) -> Optional[bytes]:
+        source = await self._get_source('persons', person_id, PERSON_FIELDS)
+        if source is None:
+            return None
+        with timed('model'):
+            return render(PersonDetails(**source).dict())
+
+    async def _load_films(self, person_id: str, page: int) -> Optional[bytes]:
+        source = await self._get_source('persons', person_id, ['film_ids'])
+        if source is None:
+            return None
+        if not source['film_ids']:
+            return render([])
+        # Сортировку и страницу считает ES: у плодовитых персон фильмов
+        # тысячи, целиком их не загружаем
+        body = {
+            'query': {'ids': {'values': source['film_ids']}},
+            'sort': get_sort('rating'),
+            'from': PERSON_FILMS_PAGE_SIZE * (page - 1),
+            'size': PERSON_FILMS_PAGE_SIZE,
+            '_source': SHORT_FILM_FIELDS,
+            'track_total_hits': False,
+        }
+        try:
+            async with self.guard.call(self.guard.search, ES_FAILURES):
+                with timed('es'):
+                    result = await self.elastic.search(index='movies', body=body)
+        except TransportError as err:
+            raise storage_error(err) from err
+        observe_es_took(result['took'])
+        with timed('model'):
+            return render([
+                ShortFilm(**doc['_source']).dict()
+                for doc in result['hits']['hits']
+            ])
+
+    async def on_persons_changed(self, person_ids: List[str]):
+        # Документы персон пересобираются ETL при любом изменении их фильмов,
+        # поэтому вместе с персоной сбрасываем и список её фильмов
+        # Версия — время изменения, а не счётчик: после истечения ключа
+        # версии прежние значения не повторяются
+        for person_id in person_ids:
+            await self.cache.delete(person_key(person_id))
+            await self.cache.set(
+                person_films_version_key(person_id),
+                time.time_ns(),
+                PERSON_CACHE_EXPIRE_IN_SECONDS,
+            )
+
+
+@lru_cache()
+def get_person_service(
+        cache: CacheBackend = Depends(get_cache),
+        redis: Redis = Depends(get_redis),
+        elastic: AsyncElasticsearch = Depends(get_elastic),
+        guard: ElasticGuard = Depends(get_elastic_guard)
+) -> PersonService:
+    return PersonService(cache, elastic, guard, redis)
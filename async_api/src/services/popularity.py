@@ -0,0 +1,53 @@
+import math
+import random
+from typing import List, Optional
+
+from aioredis import Redis
+
+from core import config
+
+FILMS = 'popular:films'
+SEARCHES = 'popular:searches'
+
+
+class PopularityTracker:
+    """
+    Приблизительная популярность ключей в Redis sorted set.
+    Учитывается только доля запросов (sample_rate), поэтому накладные
+    расходы на запрос — одна команда ZINCRBY в среднем на 1/sample_rate
+    запросов. Множество периодически обрезается до keep самых популярных.
+    Без Redis популярность не учитывается.
+    """
+
+    def __init__(
+            self,
+            redis: Optional[Redis],
+            sample_rate: float = config.POPULARITY_SAMPLE_RATE,
+            keep: int = config.POPULARITY_KEEP,
+            max_ttl_factor: float = config.POPULARITY_MAX_TTL_FACTOR):
+        self.redis = redis
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self.max_ttl_factor = max_ttl_factor
+
+    async def hit(self, kind: str, member: str):
+        if self.redis is None or random.random() >= self.sample_rate:
+            return
+        await self.redis.zincrby(kind, 1, member)
+        # Обрезаем хвост примерно раз на keep учтённых запросов
+        if random.random() < 1 / self.keep:
+            await self.redis.zremrangebyrank(kind, 0, -self.keep - 1)
+
+    async def ttl_factor(self, kind: str, member: str) -> float:
+        # Популярные записи живут в кеше дольше: множитель растёт
+        # логарифмически от числа учтённых обращений
+        if self.redis is None:
+            return 1
+        score = await self.redis.zscore(kind, member) or 0
+        return min(self.max_ttl_factor, 1 + math.log2(1 + score))
+
+    async def top(self, kind: str, count: int) -> List[str]:
+        if self.redis is None:
+            return []
+        members = await self.redis.zrevrange(kind, 0, count - 1)
+        return [member.decode() for member in members]
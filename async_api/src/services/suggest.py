@@ -0,0 +1,115 @@
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+import orjson
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.exceptions import TransportError
+from fastapi import Depends
+
+from core import config
+from core.metrics import CACHE_REQUESTS, observe_es_took, timed
+from db.elastic import get_elastic, get_elastic_guard
+from services.base import ES_FAILURES, storage_error
+from services.limiter import ElasticGuard
+
+SUGGEST_FIELD = 'title_suggest'
+
+
+class PrefixCache:
+    """
+    LRU-кеш в памяти воркера для самых частых префиксов.
+    Подсказки должны отвечать за миллисекунды, поэтому даже поход в Redis
+    для них лишний; короткий TTL ограничивает устаревание.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expire_at, value = item
+        if expire_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value: bytes):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+
+prefix_cache = PrefixCache(config.SUGGEST_CACHE_SIZE, config.SUGGEST_CACHE_TTL)
+
+
+def normalize_prefix(prefix: str) -> str:
+    return ' '.join(prefix.lower().split())
+
+
+class SuggestService:
+
+    def __init__(self, elastic: AsyncElasticsearch, guard: ElasticGuard):
+        self.elastic = elastic
+        self.guard = guard
+
+    # get_suggestions_raw возвращает готовое тело ответа: [{id, title}, ...]
+    async def get_suggestions_raw(self, prefix: str, size: int) -> bytes:
+        prefix = normalize_prefix(prefix)
+        key = (prefix, size)
+        data = prefix_cache.get(key)
+        if data is not None:
+            CACHE_REQUESTS.inc(kind='suggest', result='hit')
+            return data
+        CACHE_REQUESTS.inc(kind='suggest', result='miss')
+        data = await self._get_suggestions_from_elastic(prefix, size)
+        prefix_cache.set(key, data)
+        return data
+
+    async def _get_suggestions_from_elastic(self, prefix: str, size: int) -> bytes:
+        if not prefix:
+            return b'[]'
+        # Completion suggester работает по FST в памяти и не выполняет
+        # полноценный поиск, поэтому отвечает за единицы миллисекунд
+        es_query = {
+            '_source': ['title'],
+            'suggest': {
+                'title': {
+                    'prefix': prefix,
+                    'completion': {
+                        'field': SUGGEST_FIELD,
+                        'size': size,
+                        'skip_duplicates': True,
+                    },
+                },
+            },
+        }
+        try:
+            async with self.guard.call(self.guard.lookup, ES_FAILURES):
+                with timed('es'):
+                    result = await self.elastic.search(
+                        index='movies', body=es_query
+                    )
+        except TransportError as err:
+            raise storage_error(err) from err
+        observe_es_took(result['took'])
+        options = result['suggest']['title'][0]['options']
+        return orjson.dumps([
+            {'id': option['_id'], 'title': option['_source']['title']}
+            for option in options
+        ])
+
+
+@lru_cache()
+def get_suggest_service(
+        elastic: AsyncElasticsearch = Depends(get_elastic),
+        guard: ElasticGuard = Depends(get_elastic_guard)
+) -> SuggestService:
+    return SuggestService(elastic, guard)
@@ -0,0 +1,56 @@
+import asyncio
+import logging
+from functools import partial
+
+import orjson
+
+from core import config
+from models.schema_film import QueryFilms
+from services import popularity
+from services.errors import ServiceUnavailableError, StorageRequestError
+from services.film import FilmService
+
+logger = logging.getLogger(__name__)
+
+# Сколько ключей прогреваем одновременно, чтобы не перегрузить ES при деплое
+WARMUP_CONCURRENCY = 5
+
+
+async def warm_search(film_service: FilmService, search: str):
+    await film_service.get_many_films_raw(
+        QueryFilms(**orjson.loads(search)), count=False
+    )
+
+
+async def warm_up(film_service: FilmService):
+    """
+    Прогревает кеш самыми популярными фильмами и поисковыми запросами.
+    Записи, которые уже есть в кеше, повторно из ES не загружаются.
+    """
+    tracker = film_service.popularity
+    film_ids = await tracker.top(popularity.FILMS, config.WARMUP_FILMS)
+    searches = await tracker.top(popularity.SEARCHES, config.WARMUP_SEARCHES)
+    # Прогрев не засчитывается в популярность: иначе каждый перезапуск
+    # снова поднимал бы ключи, выбранные как раз за популярность
+    jobs = iter([
+        *[partial(film_service.get_by_id_raw, film_id, count=False)
+          for film_id in film_ids],
+        *[partial(warm_search, film_service, search) for search in searches],
+    ])
+
+    async def worker():
+        # Корутины создаются по одной по мере освобождения воркера
+        for job in jobs:
+            try:
+                await job()
+            except (
+                    ServiceUnavailableError, StorageRequestError, ValueError
+            ) as err:
+                # Прогрев — не обязательный шаг: ошибка одного ключа
+                # (ES недоступен, индекса ещё нет, 400) не мешает старту
+                logger.warning(f'Прогрев пропущен: {err!r}')
+
+    await asyncio.gather(*[worker() for _ in range(WARMUP_CONCURRENCY)])
+    logger.info(
+        f'Кеш прогрет: {len(film_ids)} фильмов, {len(searches)} запросов'
+    )
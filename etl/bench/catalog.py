@@ -0,0 +1,203 @@
+"""
+Синтетический каталог в схеме content для бенчмарка ETL.
+Таблицы создаются миграциями admin_panel (схема — init.sql).
+
+Размер состава фильма распределён по степенному закону: у большинства
+фильмов несколько персон, у немногих — сотни. Персоны и жанры выбираются
+по Парето, поэтому у популярных персон и жанров тысячи фильмов.
+"""
+import csv
+import io
+import random
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List
+
+GENRES = [
+    'Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary',
+    'Drama', 'Family', 'Fantasy', 'History', 'Horror', 'Music', 'Mystery',
+    'Romance', 'Sci-Fi', 'Thriller', 'War', 'Western',
+]
+WORDS = [
+    'star', 'war', 'night', 'love', 'dark', 'city', 'last', 'king', 'story',
+    'man', 'world', 'dead', 'life', 'time', 'return', 'secret', 'lost',
+    'blood', 'space', 'ghost', 'dream', 'river', 'fire', 'empire', 'house',
+]
+ROLES = ('actor', 'director', 'writer')
+
+TABLES = (
+    'person_film_work', 'genre_film_work', 'film_work', 'person', 'genre',
+)
+
+# Строк в одном COPY
+COPY_CHUNK = 10000
+
+
+def pareto_index(rng: random.Random, count: int, alpha: float) -> int:
+    # 0 — самый популярный элемент, дальше популярность быстро падает.
+    # Масштаб растягивает «голову» распределения на 0.1% элементов,
+    # иначе половина выборок приходилась бы на один элемент
+    scale = max(1, count // 1000)
+    return int((rng.paretovariate(alpha) - 1) * scale) % count
+
+
+def cast_size(rng: random.Random, max_cast: int, alpha: float = 1.5) -> int:
+    return min(max_cast, int(rng.paretovariate(alpha)) + 1)
+
+
+def pick(
+        rng: random.Random,
+        ids: List[str],
+        count: int,
+        alpha: float) -> List[str]:
+    count = min(count, len(ids))
+    result = {}
+    while len(result) < count:
+        result[ids[pareto_index(rng, len(ids), alpha)]] = None
+    return list(result)
+
+
+def copy_rows(cursor, table: str, columns: List[str], rows: Iterable[tuple]):
+    """Заливает строки через COPY пачками по COPY_CHUNK."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    written = 0
+
+    def flush():
+        buffer.seek(0)
+        cursor.copy_expert(
+            f'COPY content.{table} ({", ".join(columns)}) '
+            f'FROM STDIN WITH (FORMAT csv)',
+            buffer,
+        )
+        buffer.seek(0)
+        buffer.truncate()
+
+    for row in rows:
+        writer.writerow(row)
+        written += 1
+        if written % COPY_CHUNK == 0:
+            flush()
+    if written % COPY_CHUNK:
+        flush()
+    return written
+
+
+class Catalog:
+    """
+    Генератор каталога. При одинаковом seed каталог получается одинаковым,
+    поэтому прогоны на разных версиях ETL можно сравнивать.
+    """
+
+    def __init__(
+            self,
+            films: int,
+            persons: int,
+            genres: int = len(GENRES),
+            max_cast: int = 300,
+            seed: int = 0):
+        self.films = films
+        self.persons = persons
+        self.genres = genres
+        self.max_cast = max_cast
+        self.random = random.Random(seed)
+        self.now = datetime.now(timezone.utc)
+        self.person_ids = [self.uuid() for _ in range(persons)]
+        self.genre_ids = [self.uuid() for _ in range(genres)]
+        self.film_ids: List[str] = []
+
+    def uuid(self) -> str:
+        return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+    def genre_rows(self) -> Iterator[tuple]:
+        for i, genre_id in enumerate(self.genre_ids):
+            name = GENRES[i % len(GENRES)]
+            if i >= len(GENRES):
+                name = f'{name} {i // len(GENRES)}'
+            yield genre_id, name, f'{name} films', self.now, self.now
+
+    def person_rows(self) -> Iterator[tuple]:
+        for i, person_id in enumerate(self.person_ids):
+            yield person_id, f'Person {i}', self.now, self.now
+
+    def film_rows(self) -> Iterator[tuple]:
+        for _ in range(self.films):
+            film_id = self.uuid()
+            self.film_ids.append(film_id)
+            title = ' '.join(
+                self.random.choices(WORDS, k=self.random.randint(1, 4))
+            ).title()
+            yield (
+                film_id,
+                title,
+                ' '.join(self.random.choices(WORDS, k=60)),
+                round(self.random.uniform(1, 10), 1),
+                self.random.choice(['movie', 'tv_show']),
+                self.now,
+                self.now,
+            )
+
+    def genre_film_rows(self) -> Iterator[tuple]:
+        for film_id in self.film_ids:
+            for genre_id in pick(
+                    self.random, self.genre_ids, self.random.randint(1, 3), 1.2):
+                yield self.uuid(), film_id, genre_id, self.now, self.now
+
+    def person_film_rows(self) -> Iterator[tuple]:
+        for film_id in self.film_ids:
+            size = cast_size(self.random, self.max_cast)
+            directors = pick(
+                self.random, self.person_ids, self.random.randint(1, 2), 1.1
+            )
+            writers = pick(
+                self.random, self.person_ids, self.random.randint(0, 3), 1.1
+            )
+            actors = pick(self.random, self.person_ids, size, 1.1)
+            for role, person_ids in zip(ROLES, (actors, directors, writers)):
+                for person_id in person_ids:
+                    yield (
+                        self.uuid(), film_id, person_id, role,
+                        self.now, self.now,
+                    )
+
+    def seed(self, connection) -> Dict[str, int]:
+        """
+        Очищает таблицы content и заливает в них каталог.
+        Возвращает число строк по таблицам.
+        """
+        counts = {}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'TRUNCATE ' + ', '.join(f'content.{t}' for t in TABLES)
+            )
+            counts['genre'] = copy_rows(
+                cursor, 'genre',
+                ['id', 'name', 'description', 'created', 'modified'],
+                self.genre_rows(),
+            )
+            counts['person'] = copy_rows(
+                cursor, 'person',
+                ['id', 'full_name', 'created', 'modified'],
+                self.person_rows(),
+            )
+            counts['film_work'] = copy_rows(
+                cursor, 'film_work',
+                ['id', 'title', 'description', 'rating', 'type',
+                 'created', 'modified'],
+                self.film_rows(),
+            )
+            counts['genre_film_work'] = copy_rows(
+                cursor, 'genre_film_work',
+                ['id', 'film_work_id', 'genre_id', 'created', 'modified'],
+                self.genre_film_rows(),
+            )
+            counts['person_film_work'] = copy_rows(
+                cursor, 'person_film_work',
+                ['id', 'film_work_id', 'person_id', 'role',
+                 'created', 'modified'],
+                self.person_film_rows(),
+            )
+            for table in TABLES:
+                cursor.execute(f'ANALYZE content.{table}')
+        connection.commit()
+        return counts
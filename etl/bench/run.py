@@ -0,0 +1,276 @@
+"""
+Бенчмарк ETL Postgres -> Elasticsearch.
+
+Заполняет локальный Postgres синтетическим каталогом (catalog.py) и
+прогоняет pg_to_es.movies.run в нескольких режимах:
+
+    full        — загрузка всего каталога в пустые индексы
+    incremental — изменено --updates случайных фильмов
+    fanout      — переименованы самые популярные персоны и жанры,
+                  за ними переиндексируются все их фильмы
+
+Каждый режим выполняется в отдельном процессе, чтобы пиковый RSS
+относился только к нему. Подключения берутся из тех же переменных
+окружения, что и у ETL (settings.py).
+
+Пример:
+    python run.py --films 20000 --persons 50000 --output results.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from functools import wraps
+
+ETL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ETL_DIR)
+
+import psycopg2  # noqa: E402
+
+from catalog import Catalog  # noqa: E402
+
+SCENARIOS = ('full', 'incremental', 'fanout')
+
+
+class Metrics:
+    """Время и число вызовов запросов к Postgres и bulk в Elasticsearch."""
+
+    def __init__(self):
+        self.pg_queries = 0
+        self.pg_seconds = 0.0
+        self.bulks = 0
+        self.bulk_seconds = 0.0
+        self.movies = 0
+        self.related = 0
+
+    def timed(self, func, kind: str):
+        @wraps(func)
+        def inner(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                if kind == 'pg':
+                    self.pg_queries += 1
+                    self.pg_seconds += elapsed
+                else:
+                    self.bulks += 1
+                    self.bulk_seconds += elapsed
+        return inner
+
+    def counted(self, func, attr: str):
+        @wraps(func)
+        def inner(es_db, index, data):
+            setattr(self, attr, getattr(self, attr) + len(data))
+            return func(es_db, index, data)
+        return inner
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss в Linux — в килобайтах
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def run_scenario(state_path: str, batch_limit: int, queue):
+    """Один прогон movies.run с замерами. Выполняется в дочернем процессе."""
+    from loguru import logger
+    from db.pg_db import PostgresBase
+    from pg_to_es import movies
+    from pg_to_es.loaders.movies import ElasticMovies
+
+    logger.remove()
+    metrics = Metrics()
+    PostgresBase.query = metrics.timed(PostgresBase.query, 'pg')
+    ElasticMovies.save_bulk = metrics.counted(
+        metrics.timed(ElasticMovies.save_bulk, 'bulk'), 'movies'
+    )
+    ElasticMovies.save_documents = metrics.counted(
+        metrics.timed(ElasticMovies.save_documents, 'bulk'), 'related'
+    )
+    movies.LocalStorage = state_path
+    movies.batch_limit = batch_limit
+
+    start = time.perf_counter()
+    movies.run()
+    elapsed = time.perf_counter() - start
+    queue.put({
+        'elapsed_s': round(elapsed, 2),
+        'movies_docs': metrics.movies,
+        'related_docs': metrics.related,
+        'docs_per_s': round(metrics.movies / elapsed, 1) if elapsed else 0,
+        'pg_queries': metrics.pg_queries,
+        'pg_query_s': round(metrics.pg_seconds, 2),
+        'bulks': metrics.bulks,
+        'bulk_s': round(metrics.bulk_seconds, 2),
+        'peak_rss_mb': peak_rss_mb(),
+    })
+
+
+def measure(state_path: str, batch_limit: int) -> dict:
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(
+        target=run_scenario, args=(state_path, batch_limit, queue)
+    )
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f'ETL run failed with code {process.exitcode}')
+    return queue.get()
+
+
+def reset_indexes():
+    # Индексы пересоздаются так же, как при старте ETL (main.py)
+    from db.es_db import ElasticBase
+    from main import create_index, create_versioned_index, versioned_index
+    from pg_to_es.schema import genres, persons, schema
+    from settings import es_dsl
+
+    with ElasticBase(es_dsl) as es_db:
+        # movies — алиас: сначала удаляется индекс, на который он указывает,
+        # вместе с ним исчезает и алиас
+        for index in (versioned_index(schema), schema.index):
+            es_db.client.indices.delete(index=index, ignore=[404])
+        create_versioned_index(es_db, schema)
+        for module in (persons, genres):
+            es_db.client.indices.delete(index=module.index, ignore=[404])
+            create_index(
+                es_db,
+                module.index,
+                settings=module.settings,
+                mappings=module.mappings
+            )
+
+
+def touch_films(connection, count: int):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            UPDATE content.film_work SET modified = now()
+            WHERE id IN (
+                SELECT id FROM content.film_work ORDER BY random() LIMIT %s
+            )
+            """,
+            [count],
+        )
+    connection.commit()
+
+
+def rename_popular(connection, persons: int, genres: int) -> dict:
+    """Переименовывает персон и жанры с наибольшим числом фильмов."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            WITH popular AS (
+                SELECT person_id, count(DISTINCT film_work_id) AS films
+                FROM content.person_film_work
+                GROUP BY person_id ORDER BY films DESC LIMIT %s
+            )
+            UPDATE content.person p
+            SET full_name = p.full_name || ' Jr.', modified = now()
+            FROM popular WHERE p.id = popular.person_id
+            RETURNING popular.films
+            """,
+            [persons],
+        )
+        person_films = sum(row[0] for row in cursor.fetchall())
+        cursor.execute(
+            """
+            WITH popular AS (
+                SELECT genre_id, count(*) AS films
+                FROM content.genre_film_work
+                GROUP BY genre_id ORDER BY films DESC LIMIT %s
+            )
+            UPDATE content.genre g
+            SET name = g.name || ' (new)', modified = now()
+            FROM popular WHERE g.id = popular.genre_id
+            RETURNING popular.films
+            """,
+            [genres],
+        )
+        genre_films = sum(row[0] for row in cursor.fetchall())
+    connection.commit()
+    return {'person_films': person_films, 'genre_films': genre_films}
+
+
+def main(args):
+    from settings import batch_limit, pg_dsl
+
+    batch_limit = args.batch_limit or batch_limit
+    results = {
+        'params': {
+            'films': args.films,
+            'persons': args.persons,
+            'batch_limit': batch_limit,
+        },
+        'scenarios': {},
+    }
+    state_path = os.path.join(tempfile.mkdtemp(), 'state.json')
+    connection = psycopg2.connect(**pg_dsl)
+    try:
+        if args.seed:
+            start = time.perf_counter()
+            catalog = Catalog(
+                args.films,
+                args.persons,
+                max_cast=args.max_cast,
+                seed=args.seed_value,
+            )
+            results['params']['rows'] = catalog.seed(connection)
+            results['params']['seed_s'] = round(time.perf_counter() - start, 2)
+
+        for scenario in args.scenarios:
+            if scenario == 'full':
+                reset_indexes()
+                with open(state_path, 'w'):
+                    pass
+            elif scenario == 'incremental':
+                touch_films(connection, args.updates)
+            elif scenario == 'fanout':
+                results['params']['fanout'] = rename_popular(
+                    connection, args.fanout_persons, args.fanout_genres
+                )
+            results['scenarios'][scenario] = measure(state_path, batch_limit)
+            print(scenario, json.dumps(results['scenarios'][scenario]))
+    finally:
+        connection.close()
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--films', type=int, default=20000)
+    parser.add_argument('--persons', type=int, default=50000)
+    parser.add_argument(
+        '--max-cast', type=int, default=300,
+        help='наибольшее число актёров у фильма'
+    )
+    parser.add_argument('--seed-value', type=int, default=0)
+    parser.add_argument(
+        '--no-seed', dest='seed', action='store_false',
+        help='не пересоздавать каталог, взять данные из Postgres как есть'
+    )
+    parser.add_argument(
+        '--batch-limit', type=int,
+        help='размер пачки ETL (по умолчанию из settings.py)'
+    )
+    parser.add_argument('--updates', type=int, default=1000)
+    parser.add_argument('--fanout-persons', type=int, default=5)
+    parser.add_argument('--fanout-genres', type=int, default=1)
+    parser.add_argument(
+        '--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS)
+    )
+    parser.add_argument('--output', help='куда сохранить результаты (json)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -1,6 +1,41 @@
-from elasticsearch import Elasticsearch
-from utility.backoff import backoff
-from loguru import logger
+from elasticsearch import Elasticsearch, TransportError, helpers
+from utility.retry import CircuitBreaker, RetryPolicy, retry
+from settings import (
+    breaker_failure_threshold, breaker_reset_timeout,
+    connect_deadline, retry_deadline, retry_max_attempts
+)
+
+# Перегрузка и временная недоступность кластера
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+def es_retryable(err: BaseException) -> bool:
+    # Встроенный ConnectionError — недоступность при подключении (ping),
+    # у ошибок соединения клиента status_code равен 'N/A'
+    if isinstance(err, ConnectionError):
+        return True
+    if isinstance(err, TransportError):
+        return err.status_code == 'N/A' or err.status_code in RETRY_STATUSES
+    if isinstance(err, helpers.BulkIndexError):
+        # Повторяем bulk, только если все отказы — из-за перегрузки;
+        # документы индексируются по id, повтор их не задублирует
+        return all(
+            next(iter(item.values())).get('status') in RETRY_STATUSES
+            for item in err.errors
+        )
+    return False
+
+
+es_breaker = CircuitBreaker(
+    'elasticsearch', breaker_failure_threshold, breaker_reset_timeout
+)
+es_retry = RetryPolicy(
+    es_retryable,
+    max_attempts=retry_max_attempts,
+    deadline=retry_deadline,
+    breaker=es_breaker,
+)
+es_connect_retry = es_retry.replace(max_attempts=None, deadline=connect_deadline)
 
 
 class ElasticBase:
@@ -8,11 +43,12 @@ class ElasticBase:
     def __init__(self, dsl):
         self.dsl = dsl
 
-    @backoff(logger=logger)
+    @retry(es_connect_retry)
     def __enter__(self):
         self.client = Elasticsearch(**self.dsl)
         if not self.client.ping():
-            raise ValueError("Elasticsearch connection error")
+            self.client.close()
+            raise ConnectionError("Elasticsearch connection error")
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -1,30 +1,58 @@
 import psycopg2
 from psycopg2.extras import DictCursor
-from utility.backoff import backoff
-from loguru import logger
+from utility.retry import CircuitBreaker, RetryPolicy, retry, retry_on
+from settings import (
+    breaker_failure_threshold, breaker_reset_timeout,
+    connect_deadline, retry_deadline, retry_max_attempts
+)
+
+# Обрыв соединения и недоступность сервера. Ошибки в самих запросах
+# (синтаксис, ограничения) повторять бессмысленно
+PG_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+pg_breaker = CircuitBreaker(
+    'postgres', breaker_failure_threshold, breaker_reset_timeout
+)
+pg_retry = RetryPolicy(
+    retry_on(*PG_ERRORS),
+    max_attempts=retry_max_attempts,
+    deadline=retry_deadline,
+    breaker=pg_breaker,
+)
+pg_connect_retry = pg_retry.replace(max_attempts=None, deadline=connect_deadline)
 
 
 class PostgresBase:
 
     def __init__(self, dsl):
         self.dsl = dsl
+        self.connection = None
 
-    @backoff(logger=logger)
-    def __enter__(self):
+    def connect(self):
         self.connection = psycopg2.connect(
             **self.dsl, cursor_factory=DictCursor
         )
         self.cursor = self.connection.cursor()
+
+    @retry(pg_connect_retry)
+    def __enter__(self):
+        self.connect()
         return self
 
+    @retry(pg_retry)
     def query(self, sql):
+        # Все запросы ETL — чтение, их можно безопасно повторить
+        # на новом соединении
+        if self.connection is None or self.connection.closed:
+            self.connect()
         try:
             self.cursor.execute(sql, [])
-        except (psycopg2.OperationalError, psycopg2.InterfaceError):
-            self.__enter__()
-
+        except PG_ERRORS:
+            self.connection.close()
+            raise
         return self.cursor
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.connection.commit()
-        self.connection.close()
\ No newline at end of file
+        if not self.connection.closed:
+            self.connection.commit()
+            self.connection.close()
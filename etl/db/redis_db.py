@@ -0,0 +1,38 @@
+from redis import Redis
+from redis.exceptions import ConnectionError, TimeoutError
+from utility.retry import CircuitBreaker, RetryPolicy, retry, retry_on
+from settings import (
+    breaker_failure_threshold, breaker_reset_timeout,
+    connect_deadline, retry_deadline, retry_max_attempts
+)
+
+redis_breaker = CircuitBreaker(
+    'redis', breaker_failure_threshold, breaker_reset_timeout
+)
+# Клиент сам переподключается при следующей команде,
+# поэтому достаточно повторить команду
+redis_retry = RetryPolicy(
+    retry_on(ConnectionError, TimeoutError),
+    max_attempts=retry_max_attempts,
+    deadline=retry_deadline,
+    breaker=redis_breaker,
+)
+redis_connect_retry = redis_retry.replace(
+    max_attempts=None, deadline=connect_deadline
+)
+
+
+class RedisBase:
+
+    def __init__(self, dsl):
+        self.dsl = dsl
+
+    @retry(redis_connect_retry)
+    def __enter__(self):
+        self.client = Redis(**self.dsl)
+        if not self.client.ping():
+            raise ConnectionError("Redis connection error")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.client.close()
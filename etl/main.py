@@ -1,33 +1,143 @@
 from pg_to_es import movies
-from settings import es_dsl
+from pg_to_es.publishers.movies import RedisMovies
+from settings import es_dsl, redis_dsl
 from db.es_db import ElasticBase
+from elasticsearch import RequestError
 from loguru import logger
-from pg_to_es.schema import schema
+from pg_to_es.schema import genres, persons, schema
+from utility.retry import RetryError
+import hashlib
+import json
 import time
 
 
 
-def create_index(es_db, index, settings, mappings):
-    res = es_db.client.indices.create(
-      index=index,
-      settings=settings,
-      mappings=mappings,
-      ignore=400
+def schema_hash(mappings) -> str:
+    return hashlib.sha1(
+        json.dumps(mappings, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def mark_loaded(es_db, index, mappings):
+    # Отметка в _meta индекса: документы загружены по этой схеме.
+    # Ставится только после того, как полная загрузка запущена
+    res = es_db.client.indices.put_mapping(
+        index=index, body={'_meta': {'schema_hash': schema_hash(mappings)}}
     )
+    logger.info(f'{index} marked, {res}')
+
+
+def create_index(es_db, index, settings, mappings):
+    """
+    Создаёт индекс или добавляет в существующий новые поля схемы.
+    Возвращает True, если документы нужно загрузить заново: индекс новый
+    или схема изменилась после загрузки. Новые поля у уже загруженных
+    документов пусты, и запросы с фильтром по ним эти документы теряют.
+    """
+    try:
+        res = es_db.client.indices.create(
+          index=index,
+          settings=settings,
+          mappings=mappings,
+        )
+    except RequestError as err:
+        # Остальные 400 (некорректные настройки или схема) — ошибка
+        # конфигурации, продолжать с ней нельзя
+        if err.error != 'resource_already_exists_exception':
+            raise
+        res = err.info
     logger.info(f'{index}, {res}')
+    res = es_db.client.indices.put_mapping(index=index, body=mappings)
+    logger.info(f'{index} mapping, {res}')
+    res = es_db.client.indices.get_mapping(index=index)
+    meta = next(iter(res.values()))['mappings'].get('_meta', {})
+    return meta.get('schema_hash') != schema_hash(mappings)
 
 
-if __name__ == '__main__':
-    with ElasticBase(es_dsl) as es_db:
-        create_index(
-            es_db,
-            'movies',
-            settings=schema.settings,
-            mappings=schema.mappings
+def versioned_index(module) -> str:
+    return f'{module.index}_v{module.version}'
+
+
+def create_versioned_index(es_db, module):
+    """
+    Создаёт индекс module.index_v<version> и направляет на него алиас
+    module.index. Данные из прежнего индекса (старой версии или обычного
+    индекса с именем алиаса) переливаются через _reindex, алиас
+    переключается атомарно, после чего прежний индекс удаляется.
+    _reindex копирует документы как есть, без полей, появившихся в новой
+    схеме, поэтому он лишь сохраняет выдачу до полной синхронизации.
+    Возвращает True, если фильмы нужно загрузить из Postgres заново.
+    """
+    client = es_db.client
+    alias, target = module.index, versioned_index(module)
+    current = []
+    if client.indices.exists_alias(name=alias):
+        current = list(client.indices.get_alias(name=alias))
+    elif client.indices.exists(index=alias):
+        current = [alias]
+    if current == [target]:
+        return create_index(
+            es_db, target, settings=module.settings, mappings=module.mappings
+        )
+    create_index(
+        es_db, target, settings=module.settings, mappings=module.mappings
+    )
+    actions = [{'add': {'index': target, 'alias': alias}}]
+    for old in current:
+        logger.info(f'Reindex {old} -> {target}')
+        res = client.reindex(
+            body={'source': {'index': old}, 'dest': {'index': target}},
+            wait_for_completion=True,
+            request_timeout=3600,
         )
+        logger.info(f'{target} reindex, {res}')
+        # Обычный индекс с именем алиаса удаляется в том же запросе,
+        # иначе алиас с таким именем нельзя создать
+        if old == alias:
+            actions.insert(0, {'remove_index': {'index': old}})
+        else:
+            actions.insert(0, {'remove': {'index': old, 'alias': alias}})
+    client.indices.update_aliases(body={'actions': actions})
+    for old in current:
+        if old != alias:
+            client.indices.delete(index=old, ignore=404)
+    logger.info(f'{alias} -> {target}')
+    return True
+
+
+if __name__ == '__main__':
+    with ElasticBase(es_dsl) as es_db, RedisMovies(redis_dsl) as redis_db:
+        if create_versioned_index(es_db, schema):
+            # Полная синхронизация: позиция film_work сбрасывается,
+            # и основной цикл заново загружает все фильмы
+            movies.reset_state('film_work')
+            mark_loaded(es_db, versioned_index(schema), schema.mappings)
+        if not redis_db.is_ranked_ready():
+            redis_db.rebuild_ranked(es_db, 'movies')
+        stale = [
+            related
+            for related in (persons, genres)
+            if create_index(
+                es_db,
+                related.index,
+                settings=related.settings,
+                mappings=related.mappings
+            )
+        ]
+
+    if stale:
+        movies.rebuild_related()
+        with ElasticBase(es_dsl) as es_db:
+            for related in stale:
+                mark_loaded(es_db, related.index, related.mappings)
 
     while True:
-        movies.run()
+        try:
+            movies.run()
+        except RetryError as err:
+            # Позиция (modified, id) сохраняется после каждой загруженной
+            # пачки, следующий прогон начнёт с первой незагруженной
+            logger.error(f'Синхронизация прервана: {err} ({err.__cause__!r})')
         time.sleep(5)
 
 
@@ -1,66 +1,53 @@
 import datetime
 from db.pg_db import PostgresBase
-from typing import List
+from typing import Generator, List
 from psycopg2.extras import DictRow
 
+# Меньше любого uuid: начало обхода по (modified, id)
+MIN_ID = '00000000-0000-0000-0000-000000000000'
+
 
 class PostgresMovies(PostgresBase):
 
     def clean_arr_ids(self, ids) -> List[str]:
         return [_id[0] for _id in ids]
 
-    def get_ids_gte_modified(
+    def get_ids_after(
             self,
             table_name: str,
-            state_date: datetime,
-            skip: int = 0,
-            limit: int = 100):
+            modified: datetime.datetime,
+            last_id: str = MIN_ID,
+            limit: int = 100) -> List[DictRow]:
+        # Постраничный обход по ключу (modified, id): следующая пачка
+        # начинается строго после последней обработанной строки, поэтому
+        # её (modified, id) можно сохранить как состояние синхронизации
         sql = f"""
-        SELECT id FROM {table_name}
-        WHERE modified >= '{state_date}'
-        ORDER BY modified
-        LIMIT {limit} OFFSET {skip};"""
+        SELECT id, modified FROM {table_name}
+        WHERE (modified, id) > (%(modified)s, %(id)s)
+        ORDER BY modified, id
+        LIMIT %(limit)s;"""
+        sql = self.cursor.mogrify(
+            sql, {'modified': modified, 'id': last_id, 'limit': limit}
+        )
         return self.query(sql).fetchall()
 
-    def get_all_ids_gte_modified(
+    def get_all_ids_after(
             self,
             table_name: str,
-            state_date: datetime,
-            limit: int = 100) -> List[DictRow]:
-        skip = 0
+            modified: datetime.datetime,
+            last_id: str = MIN_ID,
+            limit: int = 100) -> Generator[List[DictRow], None, None]:
         while True:
-            data = self.get_ids_gte_modified(
+            data = self.get_ids_after(
                 table_name=table_name,
-                state_date=state_date,
-                skip=skip,
+                modified=modified,
+                last_id=last_id,
                 limit=limit,
             )
             if not data:
                 break
             yield data
-            skip += limit
-
-    def get_person_data(self, ids: List[str]) -> List[DictRow]:
-        sql = """
-            SELECT fw.id
-            FROM content.film_work fw
-            LEFT JOIN content.person_film_work pfw ON pfw.film_work_id = fw.id
-            WHERE pfw.person_id IN %(ids)s
-            ORDER BY fw.modified
-        """
-        sql = self.cursor.mogrify(sql, {'ids': tuple(ids)})
-        return self.query(sql).fetchall()
-
-    def get_genre_data(self, ids: List[str]) -> List[DictRow]:
-        sql = """
-            SELECT fw.id
-            FROM content.film_work fw
-            LEFT JOIN content.genre_film_work gfw ON gfw.film_work_id = fw.id
-            WHERE gfw.genre_id IN %(ids)s
-            ORDER BY fw.modified
-        """
-        sql = self.cursor.mogrify(sql, {'ids': tuple(ids)})
-        return self.query(sql).fetchall()
+            modified, last_id = data[-1]['modified'], data[-1]['id']
 
     def get_data_from_elastic_movies(self, film_work_ids) -> List[DictRow]:
         sql = """SELECT
@@ -75,6 +62,7 @@ class PostgresMovies(PostgresBase):
             pfw.id as pfw_id,
             p.id,
             p.full_name,
+            g.id as genre_id,
             g.name
         FROM content.film_work fw
         LEFT JOIN content.person_film_work pfw ON pfw.film_work_id = fw.id
@@ -86,6 +74,36 @@ class PostgresMovies(PostgresBase):
         sql = self.cursor.mogrify(sql, {'film_work_ids': tuple(film_work_ids)})
         return self.query(sql).fetchall()
 
+    def get_persons_data(self, ids: List[str]) -> List[DictRow]:
+        # Персоны со всеми своими фильмами и ролями
+        sql = """
+            SELECT
+                p.id,
+                p.full_name,
+                pfw.film_work_id::text as fw_id,
+                pfw.role
+            FROM content.person p
+            LEFT JOIN content.person_film_work pfw ON pfw.person_id = p.id
+            WHERE p.id IN %(ids)s
+        """
+        sql = self.cursor.mogrify(sql, {'ids': tuple(ids)})
+        return self.query(sql).fetchall()
+
+    def get_genres_data(self, ids: List[str]) -> List[DictRow]:
+        sql = """
+            SELECT
+                g.id,
+                g.name,
+                g.description,
+                COUNT(gfw.id) as films_count
+            FROM content.genre g
+            LEFT JOIN content.genre_film_work gfw ON gfw.genre_id = g.id
+            WHERE g.id IN %(ids)s
+            GROUP BY g.id
+        """
+        sql = self.cursor.mogrify(sql, {'ids': tuple(ids)})
+        return self.query(sql).fetchall()
+
     def first_modified(self, table_name: str) -> DictRow:
         sql = f"""SELECT modified FROM {table_name} ORDER BY modified;"""
         return self.query(sql).fetchone()
@@ -1,11 +1,19 @@
 from elasticsearch import helpers
-from typing import List, Generator
-from db.es_db import ElasticBase
+from functools import partial
+from typing import Callable, Iterable, List, Generator
+from pydantic import BaseModel
+from db.es_db import ElasticBase, es_retry
 from loguru import logger
+from utility.retry import retry
 
 
 class ElasticMovies(ElasticBase):
 
+    def __init__(self, dsl, notifier=None):
+        super().__init__(dsl)
+        # Куда сообщать об изменённых документах (см. RedisMovies)
+        self.notifier = notifier
+
     def generate_elastic_data(self, index, data: list) -> Generator:
         for item in data:
             yield {
@@ -16,9 +24,23 @@ class ElasticMovies(ElasticBase):
 
             }
 
+    @retry(es_retry)
+    def bulk(self, actions: Callable[[], Iterable[dict]]) -> int:
+        # actions — фабрика генератора: при повторе он создаётся заново
+        res, _ = helpers.bulk(self.client, actions())
+        return res
+
     def save_bulk(self, index, data: List[dict]) -> None:
-        res, _ = helpers.bulk(
-            self.client,
-            self.generate_elastic_data(index, data)
-        )
+        res = self.bulk(partial(self.generate_elastic_data, index, data))
         logger.info(f'Synchronized recordings {res}')
+        if self.notifier is not None:
+            self.notifier.on_saved(index, data)
+
+    def save_documents(self, index, data: List[BaseModel]) -> None:
+        # Документы без особых преобразований (persons, genres)
+        res = self.bulk(lambda: (
+            {'_index': index, '_id': str(item.id), **item.dict()} for item in data
+        ))
+        logger.info(f'Synchronized {index} recordings {res}')
+        if self.notifier is not None:
+            self.notifier.publish_changed(index, [str(item.id) for item in data])
@@ -13,9 +13,33 @@ class Movies(BaseModel):
     imdb_rating: Optional[float] = Field(alias='rating', default=0.0)
     genre: Optional[List[str]] = []
     title: str
+    title_suggest: dict = {}
+    type: Optional[str] = None
     description: Optional[str] = None
     director: List[Person] = Field(alias='director', default=[])
     actors: List[Person] = Field(alias='actor', default=[])
     actors_names: List = []
     writers: List[Person] = Field(alias='writer', default=[])
     writers_names: List = []
+
+
+class PersonFilm(BaseModel):
+    id: str
+    roles: List[str] = []
+
+
+class PersonDocument(BaseModel):
+    """Персона со всеми своими фильмами и ролями (индекс persons)."""
+    id: str
+    full_name: str
+    roles: List[str] = []
+    film_ids: List[str] = []
+    films: List[PersonFilm] = []
+
+
+class GenreDocument(BaseModel):
+    """Жанр с числом фильмов (индекс genres)."""
+    id: str
+    name: str
+    description: Optional[str] = None
+    films_count: int = 0
@@ -1,15 +1,19 @@
-from typing import List, Generator
+from typing import List, Generator, Tuple
 from state import JsonFileStorage, State
-from datetime import datetime, timezone
-from pg_to_es.extractors.movies import PostgresMovies
+from datetime import datetime
+from pg_to_es.extractors.movies import MIN_ID, PostgresMovies
 from pg_to_es.transforms.movies import Transformation
 from pg_to_es.loaders.movies import ElasticMovies
-from pg_to_es.model import Person, Movies
+from pg_to_es.publishers.movies import RedisMovies
+from pg_to_es.model import (
+    GenreDocument, Person, PersonDocument, PersonFilm, Movies
+)
+from pg_to_es.schema import genres as genres_schema
+from pg_to_es.schema import persons as persons_schema
 from enum import Enum
-from utility.backoff import backoff
 from loguru import logger
 from settings import (
-    pg_dsl, es_dsl, LocalStorage, batch_limit, initial_state
+    pg_dsl, es_dsl, redis_dsl, LocalStorage, batch_limit, initial_state
 )
 
 
@@ -23,6 +27,19 @@ class Role(Enum):
         return list(map(lambda r: r.value, Role))
 
 
+def title_suggest(title: str, rating: float) -> dict:
+    """
+    Данные для completion-подсказок по названию.
+    Название подсказывается и с начала любого слова ("wars" -> "Star Wars"),
+    фильмы с высоким рейтингом показываются первыми.
+    """
+    words = title.split()
+    return {
+        'input': [' '.join(words[i:]) for i in range(len(words))] or [title],
+        'weight': int((rating or 0) * 10),
+    }
+
+
 def transform(batch_data: List[dict]) -> List[Movies]:
     trans = Transformation()
     good_data = []
@@ -30,9 +47,11 @@ def transform(batch_data: List[dict]) -> List[Movies]:
         movie = dict()
         movie['id'] = _id
         movie['title'] = trans.uniq_by_key(data, 'title')[0]
+        movie['type'] = trans.uniq_by_key(data, 'type')[0]
         movie['description'] = trans.uniq_by_key(data, 'description')[0]
         movie['rating'] = trans.uniq_by_key(data, 'rating')[0]
         movie['genre'] = trans.uniq_by_key(data, 'name')
+        movie['title_suggest'] = title_suggest(movie['title'], movie['rating'])
 
         for role in Role.list():
             role_data = [
@@ -46,54 +65,141 @@ def transform(batch_data: List[dict]) -> List[Movies]:
     return good_data
 
 
-def extract(pg_db, state, table_name: str) -> Generator:
+def transform_persons(batch_data: List[dict]) -> List[PersonDocument]:
+    trans = Transformation()
+    good_data = []
+    for _id, data in trans.groupby(batch_data, 'id'):
+        # id фильма -> роли персоны в нём
+        films = {}
+        for item in data:
+            if item['fw_id'] is None:
+                continue
+            roles = films.setdefault(item['fw_id'], [])
+            if item['role'] and item['role'] not in roles:
+                roles.append(item['role'])
+        good_data.append(PersonDocument(
+            id=_id,
+            full_name=trans.uniq_by_key(data, 'full_name')[0],
+            roles=sorted({role for roles in films.values() for role in roles}),
+            film_ids=list(films),
+            films=[
+                PersonFilm(id=fw_id, roles=roles)
+                for fw_id, roles in films.items()
+            ],
+        ))
+    return good_data
+
+
+def transform_genres(batch_data: List[dict]) -> List[GenreDocument]:
+    return [GenreDocument(**dict(item)) for item in batch_data]
+
+
+def get_position(state, table_name: str) -> Tuple[datetime, str]:
+    # Состояние таблицы — (modified, id) последней обработанной строки.
+    # Старое состояние хранило только дату
+    position = state.get_state(table_name)
+    if not position:
+        return initial_state, MIN_ID
+    if isinstance(position, str):
+        return datetime.fromisoformat(position), MIN_ID
+    return datetime.fromisoformat(position['modified']), position['id']
 
-    def clean_arr_ids(ids):
-        return [_id[0] for _id in ids]
 
-    if not state.get_state(table_name):
-        state.set_state(table_name, initial_state.isoformat())
+def reset_state(table_name: str):
+    # Следующий прогон прочитает таблицу с начала
+    State(JsonFileStorage(LocalStorage)).set_state(table_name, None)
 
-    curremt_state = datetime.fromisoformat(state.get_state(table_name))
 
-    modified_ids = pg_db.get_all_ids_gte_modified(
+def extract(pg_db, state, table_name: str) -> Generator:
+    """
+    Отдаёт пачки id изменённых строк таблицы вместе с позицией
+    (modified, id) последней строки в пачке.
+    Позицию сохраняют после загрузки пачки.
+    """
+    modified, last_id = get_position(state, table_name)
+    modified_ids = pg_db.get_all_ids_after(
         table_name=table_name,
-        state_date=curremt_state,
+        modified=modified,
+        last_id=last_id,
         limit=batch_limit
     )
-
     for batch_ids in modified_ids:
-
-        if table_name == 'person':
-            batch_ids = pg_db.get_person_data(
-                clean_arr_ids(batch_ids)
-            )
-        if table_name == 'genre':
-            batch_ids = pg_db.get_genre_data(
-                clean_arr_ids(batch_ids)
-            )
-
-        data = pg_db.get_data_from_elastic_movies(clean_arr_ids(batch_ids))
-        yield data
+        last = batch_ids[-1]
+        position = {
+            'modified': last['modified'].isoformat(),
+            'id': str(last['id']),
+        }
+        yield pg_db.clean_arr_ids(batch_ids), position
 
 
 def load(es_db, data: List[Movies]):
     es_db.save_bulk('movies', data)
 
 
+def load_persons(pg_db, es_db, ids: List[str]):
+    if ids:
+        es_db.save_documents(
+            persons_schema.index,
+            transform_persons(pg_db.get_persons_data(ids))
+        )
+
+
+def load_genres(pg_db, es_db, ids: List[str]):
+    if ids:
+        es_db.save_documents(
+            genres_schema.index,
+            transform_genres(pg_db.get_genres_data(ids))
+        )
+
+
+def load_related(pg_db, es_db, batch_data: List[dict]):
+    # Документы персон и жанров пересобираются целиком для всех,
+    # кто встретился в изменённых фильмах
+    load_persons(pg_db, es_db, list({
+        item['id'] for item in batch_data if item['id']
+    }))
+    load_genres(pg_db, es_db, list({
+        item['genre_id'] for item in batch_data if item['genre_id']
+    }))
+
+
+def rebuild_related():
+    # Полная сборка индексов persons и genres (при их создании)
+    with PostgresMovies(pg_dsl) as pg_db, \
+            ElasticMovies(es_dsl) as es_db:
+        for batch_ids in pg_db.get_all_ids_after(
+                'person', initial_state, limit=batch_limit):
+            load_persons(pg_db, es_db, pg_db.clean_arr_ids(batch_ids))
+        for batch_ids in pg_db.get_all_ids_after(
+                'genre', initial_state, limit=batch_limit):
+            load_genres(pg_db, es_db, pg_db.clean_arr_ids(batch_ids))
+
 
-@backoff(logger=logger)
 def run():
-    with PostgresMovies(pg_dsl) as pg_db, ElasticMovies(es_dsl) as es_db:
+    # Повторяются отдельные операции (подключение, запрос, bulk), а не
+    # весь прогон. Если зависимость не вернулась за дедлайн, выбрасывается
+    # RetryError; позиция сохраняется только после загрузки пачки, поэтому
+    # следующий прогон начнёт с первой незагруженной пачки
+    with PostgresMovies(pg_dsl) as pg_db, \
+            RedisMovies(redis_dsl) as redis_db, \
+            ElasticMovies(es_dsl, notifier=redis_db) as es_db:
 
         for table_name in ('film_work', 'genre', 'person'):
             storage = JsonFileStorage(LocalStorage)
             state = State(storage)
             logger.info(f'Синхронизуруем таблицу {table_name}')
-            for batch_data in extract(pg_db, state, table_name):
-                good_data = transform(batch_data)
-                load(es_db, good_data)
-                state.set_state(
-                    table_name,
-                    datetime.now(timezone.utc).isoformat()
-                )
\ No newline at end of file
+            for row_ids, position in extract(pg_db, state, table_name):
+                if table_name == 'film_work':
+                    batch_data = pg_db.get_data_from_elastic_movies(row_ids)
+                    load(es_db, transform(batch_data))
+                    load_related(pg_db, es_db, batch_data)
+                # Фильмы изменённых персон и жанров (переименование,
+                # удалённые связи) триггеры 0002 уже отметили в film_work,
+                # их загрузил проход по film_work. Здесь пересобираются
+                # только документы самих персон и жанров, в том числе
+                # отвязанных от фильмов (триггер 0004)
+                elif table_name == 'person':
+                    load_persons(pg_db, es_db, row_ids)
+                else:
+                    load_genres(pg_db, es_db, row_ids)
+                state.set_state(table_name, position)
\ No newline at end of file
@@ -0,0 +1,100 @@
+import json
+from typing import Iterable, List
+from elasticsearch import helpers
+from db.redis_db import RedisBase, redis_retry
+from loguru import logger
+from utility.retry import retry
+from pg_to_es.model import Movies
+from settings import (
+    changes_stream, changes_stream_maxlen,
+    ranked_all, ranked_films, ranked_genre_prefix, ranked_ready
+)
+
+# Поля фильма, которые хранятся для готовых страниц списка (ShortFilm в API)
+RANKED_FIELDS = ['id', 'imdb_rating', 'genre', 'title']
+# Оценка в рейтинге для фильмов без рейтинга: ниже любого настоящего
+MISSING_RATING = -1
+
+
+def ranked_genre(genre: str) -> str:
+    return f'{ranked_genre_prefix}{genre}'
+
+
+class RedisMovies(RedisBase):
+    """
+    Публикует id изменённых документов в Redis Stream.
+    API читает этот поток и инвалидирует/прогревает свой кеш,
+    поэтому время жизни кеша можно делать большим.
+
+    Кроме того, поддерживает готовые рейтинги фильмов (sorted set по
+    imdb_rating, общий и для каждого жанра), из которых API отдаёт
+    самые частые страницы списка без запросов в Elasticsearch.
+    """
+
+    def on_saved(self, index: str, data: List[Movies]) -> None:
+        # Сначала обновляем рейтинги, потом сообщаем API об изменениях,
+        # чтобы заново собранные страницы уже видели новые данные
+        self.update_ranked(
+            {field: getattr(item, field) for field in RANKED_FIELDS}
+            for item in data
+        )
+        self.publish_changed(index, [str(item.id) for item in data])
+
+    @retry(redis_retry)
+    def publish_changed(self, index: str, ids: List[str]) -> None:
+        if not ids:
+            return
+        self.client.xadd(
+            changes_stream,
+            {'index': index, 'ids': json.dumps(ids)},
+            maxlen=changes_stream_maxlen,
+            approximate=True,
+        )
+        logger.info(f'Published {len(ids)} changed ids of {index}')
+
+    def update_ranked(self, films: Iterable[dict]) -> None:
+        self._update_ranked(list(films))
+
+    @retry(redis_retry)
+    def _update_ranked(self, films: List[dict]) -> None:
+        # Повтор безопасен: ZADD и HSET идемпотентны
+        if not films:
+            return
+        ids = [film['id'] for film in films]
+        # Старые жанры нужны, чтобы убрать фильм из рейтингов жанров,
+        # которых у него больше нет
+        old_films = self.client.hmget(ranked_films, ids)
+        pipe = self.client.pipeline(transaction=False)
+        for film, old_film in zip(films, old_films):
+            rating = film['imdb_rating']
+            if rating is None:
+                # В ES фильмы без рейтинга идут после всех (missing _last)
+                rating = MISSING_RATING
+            genres = set(film['genre'] or [])
+            old_genres = set(json.loads(old_film)['genre'] or []) if old_film else set()
+            for genre in old_genres - genres:
+                pipe.zrem(ranked_genre(genre), film['id'])
+            pipe.zadd(ranked_all, {film['id']: rating})
+            for genre in genres:
+                pipe.zadd(ranked_genre(genre), {film['id']: rating})
+            pipe.hset(ranked_films, film['id'], json.dumps(film))
+        pipe.execute()
+
+    def is_ranked_ready(self) -> bool:
+        return bool(self.client.exists(ranked_ready))
+
+    def rebuild_ranked(self, es_db, index: str, batch_size: int = 1000) -> None:
+        # Полная сборка рейтингов из индекса (например, после очистки Redis).
+        # Дальше они поддерживаются инкрементально в on_saved
+        self.client.delete(ranked_ready)
+        for key in self.client.scan_iter(match=f'{ranked_all}*'):
+            self.client.delete(key)
+        batch = []
+        for doc in helpers.scan(es_db.client, index=index, _source=RANKED_FIELDS):
+            batch.append({field: doc['_source'].get(field) for field in RANKED_FIELDS})
+            if len(batch) >= batch_size:
+                self.update_ranked(batch)
+                batch = []
+        self.update_ranked(batch)
+        self.client.set(ranked_ready, 1)
+        logger.info(f'Ranked lists rebuilt, {self.client.zcard(ranked_all)} films')
@@ -0,0 +1,23 @@
+from pg_to_es.schema import schema
+
+index = 'genres'
+# Анализаторы те же, что и у индекса movies
+settings = schema.base_settings
+mappings = {
+    "dynamic": "strict",
+    "properties": {
+      "id": {
+        "type": "keyword"
+      },
+      "name": {
+        "type": "keyword"
+      },
+      "description": {
+        "type": "text",
+        "analyzer": "ru_en"
+      },
+      "films_count": {
+        "type": "integer"
+      }
+    }
+  }
@@ -0,0 +1,32 @@
+from pg_to_es.schema import schema
+
+index = 'persons'
+# Анализаторы те же, что и у индекса movies
+settings = schema.base_settings
+mappings = {
+    "dynamic": "strict",
+    "properties": {
+      "id": {
+        "type": "keyword"
+      },
+      "full_name": {
+        "type": "text",
+        "analyzer": "ru_en",
+        "fields": {
+          "raw": {
+            "type":  "keyword"
+          }
+        }
+      },
+      "roles": {
+        "type": "keyword"
+      },
+      "film_ids": {
+        "type": "keyword"
+      },
+      "films": {
+        "type": "object",
+        "enabled": False
+      }
+    }
+  }
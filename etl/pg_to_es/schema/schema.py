@@ -1,5 +1,13 @@
+# index — алиас, через который индекс читают API и пишет ETL.
+# Настройки вроде index.sort нельзя поменять у готового индекса, поэтому
+# при их изменении version увеличивается: main.py создаёт новый индекс
+# movies_v<version>, переливает в него данные и переключает алиас.
+# index.sort несовместим с nested-полями, поэтому actors и writers —
+# обычные object: фильтр по id персоны их корреляции не требует
 index = 'movies'
-settings = {
+version = 3
+# Общие настройки (анализаторы) для индексов movies, persons и genres
+base_settings = {
     "refresh_interval": "1s",
     "analysis": {
       "filter": {
@@ -39,6 +47,18 @@ settings = {
       }
     }
   }
+settings = {
+    **base_settings,
+    # Сегменты отсортированы так же, как самый частый список в API
+    # (сортировка по рейтингу): запрос с той же сортировкой и
+    # ограниченным track_total_hits завершается, собрав первые документы.
+    # Равные рейтинги упорядочены по id, как в готовых рейтингах ETL
+    # (ZSET упорядочивает равные оценки по члену — id фильма)
+    "index": {
+      "sort.field": ["imdb_rating", "id"],
+      "sort.order": ["desc", "desc"]
+    }
+  }
 mappings = {
     "dynamic": "strict",
     "properties": {
@@ -60,6 +80,13 @@ mappings = {
           }
         }
       },
+      "title_suggest": {
+        "type": "completion",
+        "analyzer": "simple"
+      },
+      "type": {
+        "type": "keyword"
+      },
       "description": {
         "type": "text",
         "analyzer": "ru_en"
@@ -77,7 +104,7 @@ mappings = {
         "analyzer": "ru_en"
       },
       "actors": {
-        "type": "nested",
+        "type": "object",
         "dynamic": "strict",
         "properties": {
           "id": {
@@ -90,7 +117,7 @@ mappings = {
         }
       },
       "writers": {
-        "type": "nested",
+        "type": "object",
         "dynamic": "strict",
         "properties": {
           "id": {
@@ -23,6 +23,30 @@ es_dsl = {
     )
 }
 
+redis_dsl = {
+    'host': os.environ.get('REDIS_HOST', '127.0.0.1'),
+    'port': int(os.environ.get('REDIS_PORT', 6379)),
+}
+
+# Поток, в который ETL пишет id изменённых фильмов для инвалидации кеша API
+changes_stream = os.environ.get('CHANGES_STREAM', 'movies:changed')
+changes_stream_maxlen = 10000
+
+# Готовые рейтинги фильмов для самых частых страниц списка в API
+ranked_all = 'ranked:rating'
+ranked_genre_prefix = 'ranked:rating:genre:'
+ranked_films = 'ranked:films'
+ranked_ready = 'ranked:ready'
+
+# Повторы операций с Postgres, Elasticsearch и Redis (utility/retry.py):
+# общий дедлайн одной операции, дедлайн подключения (при старте сервисы
+# могут подниматься долго) и параметры circuit breaker зависимости
+retry_deadline = float(os.environ.get('RETRY_DEADLINE', 60))
+retry_max_attempts = int(os.environ.get('RETRY_MAX_ATTEMPTS', 10))
+connect_deadline = float(os.environ.get('CONNECT_DEADLINE', 300))
+breaker_failure_threshold = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', 5))
+breaker_reset_timeout = float(os.environ.get('BREAKER_RESET_TIMEOUT', 30))
+
 LocalStorage = join(dirname(__file__), 'storage.json')
 
 batch_limit = 10
@@ -0,0 +1,228 @@
+import asyncio
+import random
+import threading
+import time
+from functools import wraps
+from typing import Callable, Optional, Type
+from loguru import logger
+
+
+class RetryError(Exception):
+    """
+    Повторы исчерпаны: превышено число попыток или общий дедлайн.
+    Последняя ошибка операции доступна в __cause__.
+    """
+
+
+class CircuitOpenError(Exception):
+    """Цепь разомкнута: зависимость недавно много раз подряд отказывала."""
+
+    def __init__(self, name: str, remaining: float):
+        super().__init__(f'{name}: circuit breaker is open')
+        self.remaining = remaining
+
+
+class CircuitBreaker:
+    """
+    Общий для всех операций с одной зависимостью (Postgres, Elasticsearch,
+    Redis). После failure_threshold ошибок подряд размыкается и
+    reset_timeout секунд сразу отклоняет вызовы, не нагружая зависимость.
+    Затем пропускает один пробный вызов (half-open): при успехе
+    замыкается, при ошибке снова размыкается.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def before_call(self) -> bool:
+        """
+        Возвращает True, если вызов стал пробным: тогда после него
+        обязательно вызывается end_probe(), каким бы ни был исход.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0 or self._probing:
+                raise CircuitOpenError(self.name, max(remaining, 0))
+            self._probing = True
+            return True
+
+    def end_probe(self):
+        # Пробный вызов мог завершиться ошибкой, которая не говорит
+        # о состоянии зависимости (не повторяемой): цепь остаётся
+        # разомкнутой, следующий вызов снова будет пробным
+        with self._lock:
+            self._probing = False
+
+    def on_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def on_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(f'{self.name}: circuit breaker opened')
+                self._opened_at = time.monotonic()
+
+
+class RetryPolicy:
+    """
+    Правила повтора операции.
+
+    Пауза перед попыткой n выбирается случайно (full jitter) из
+    [0, min(max_delay, base_delay * 2^n)], поэтому воркеры, одновременно
+    потерявшие зависимость, не повторяют запросы в такт.
+    Повторяются только ошибки, для которых retryable вернул True,
+    остальные пробрасываются сразу. Повторы прекращаются после
+    max_attempts попыток или через deadline секунд от первой
+    (None — без ограничения).
+    """
+
+    def __init__(
+            self,
+            retryable: Callable[[BaseException], bool],
+            base_delay: float = 0.1,
+            max_delay: float = 10,
+            max_attempts: Optional[int] = None,
+            deadline: Optional[float] = 60,
+            breaker: Optional[CircuitBreaker] = None):
+        self.retryable = retryable
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.breaker = breaker
+
+    def replace(self, **changes) -> 'RetryPolicy':
+        params = {
+            'retryable': self.retryable,
+            'base_delay': self.base_delay,
+            'max_delay': self.max_delay,
+            'max_attempts': self.max_attempts,
+            'deadline': self.deadline,
+            'breaker': self.breaker,
+        }
+        return RetryPolicy(**{**params, **changes})
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+def retry_on(*errors: Type[BaseException]) -> Callable[[BaseException], bool]:
+    """Классификатор: повторять ошибки перечисленных типов."""
+    def retryable(err: BaseException) -> bool:
+        return isinstance(err, errors)
+    return retryable
+
+
+class _Attempts:
+    # Состояние повторов одного вызова, общее для sync и async вариантов
+
+    def __init__(self, policy: RetryPolicy, name: str):
+        self.policy = policy
+        self.name = name
+        self.attempt = 0
+        self.started = time.monotonic()
+        self.probe = False
+
+    def before_call(self):
+        if self.policy.breaker is not None:
+            self.probe = self.policy.breaker.before_call()
+
+    def after_call(self):
+        if self.probe:
+            self.probe = False
+            self.policy.breaker.end_probe()
+
+    def on_success(self):
+        if self.policy.breaker is not None:
+            self.policy.breaker.on_success()
+
+    def on_error(self, err: BaseException) -> float:
+        """Возвращает паузу перед следующей попыткой или пробрасывает ошибку."""
+        policy = self.policy
+        if isinstance(err, CircuitOpenError):
+            # Вызова не было, ждём хотя бы до пробного запроса
+            delay = max(policy.delay(self.attempt), err.remaining)
+        elif policy.retryable(err):
+            if policy.breaker is not None:
+                policy.breaker.on_failure()
+            delay = policy.delay(self.attempt)
+        else:
+            raise err
+        self.attempt += 1
+        if policy.max_attempts is not None and self.attempt >= policy.max_attempts:
+            raise RetryError(
+                f'{self.name}: {self.attempt} attempts failed'
+            ) from err
+        if policy.deadline is not None:
+            left = self.started + policy.deadline - time.monotonic()
+            if left <= delay:
+                raise RetryError(
+                    f'{self.name}: deadline {policy.deadline}s exceeded'
+                ) from err
+        logger.warning(
+            f'{self.name}: attempt {self.attempt} failed ({err!r}), '
+            f'retry in {delay:.2f}s'
+        )
+        return delay
+
+
+def retry(policy: RetryPolicy):
+    """
+    Декоратор повтора одной операции (подключение, запрос, bulk)
+    по правилам policy. Работает и с обычными функциями, и с корутинами;
+    в корутинах пауза не блокирует event loop.
+    """
+
+    def func_wrapper(func):
+        name = func.__qualname__
+
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_inner(*args, **kwargs):
+                attempts = _Attempts(policy, name)
+                while True:
+                    try:
+                        attempts.before_call()
+                        try:
+                            result = await func(*args, **kwargs)
+                        finally:
+                            attempts.after_call()
+                    except Exception as err:
+                        await asyncio.sleep(attempts.on_error(err))
+                    else:
+                        attempts.on_success()
+                        return result
+            return async_inner
+
+        @wraps(func)
+        def inner(*args, **kwargs):
+            attempts = _Attempts(policy, name)
+            while True:
+                try:
+                    attempts.before_call()
+                    try:
+                        result = func(*args, **kwargs)
+                    finally:
+                        attempts.after_call()
+                except Exception as err:
+                    time.sleep(attempts.on_error(err))
+                else:
+                    attempts.on_success()
+                    return result
+        return inner
+
+    return func_wrapper